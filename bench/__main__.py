@@ -0,0 +1,150 @@
+# © 2018–2020 io mintz <io@mintz.cc>
+#
+# Emote Manager is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# Emote Manager is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Emote Manager. If not, see <https://www.gnu.org/licenses/>.
+
+"""run the benchmarks, optionally saving the results as a baseline or comparing them to one
+
+Each benchmark runs in a fresh interpreter, so that peak RSS is measured for it alone.
+The corpus is generated once and handed to each of them.
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import pickle
+import platform
+import subprocess
+import sys
+import tempfile
+
+# results where lower is better. For every other metric, higher is better.
+LOWER_IS_BETTER = {'p50_ms', 'p90_ms', 'p99_ms', 'peak_rss_kib'}
+COMPARED_METRICS = ('ops_per_s', 'p50_ms', 'p99_ms', 'peak_rss_kib')
+
+def run_one(name, corpus_path, *, repeat, warmup):
+	"""the child process side: run a single benchmark and print its results as JSON"""
+	from . import benchmarks  # registers them
+	from .harness import BENCHMARKS, measure
+
+	with open(corpus_path, 'rb') as f:
+		corpus = pickle.load(f)
+
+	workload = BENCHMARKS[name](corpus)
+	if isinstance(workload, str):
+		result = {'skipped': workload}
+	elif not workload.items:
+		result = {'skipped': 'the corpus has no suitable inputs'}
+	else:
+		result = measure(workload, repeat=repeat, warmup=warmup)
+	json.dump(result, sys.stdout)
+
+def run_all(names, *, seed, repeat, warmup):
+	from . import corpus
+
+	results = {}
+	with tempfile.TemporaryDirectory() as tmpdir:
+		corpus_path = os.path.join(tmpdir, 'corpus.pickle')
+		with open(corpus_path, 'wb') as f:
+			pickle.dump(corpus.generate(seed), f)
+
+		for name in names:
+			proc = subprocess.run(
+				[
+					sys.executable, '-m', __package__, '--run-one', name, '--corpus', corpus_path,
+					'--repeat', str(repeat), '--warmup', str(warmup)],
+				stdout=subprocess.PIPE, check=True, text=True)
+			results[name] = json.loads(proc.stdout)
+			print_result(name, results[name])
+
+	return results
+
+def print_result(name, result):
+	if 'skipped' in result:
+		print(f'{name:<24} skipped: {result["skipped"]}')
+		return
+	print(
+		f'{name:<24} {result["ops_per_s"]:10.1f} op/s {result["mib_per_s"]:9.1f} MiB/s  '
+		f'p50 {result["p50_ms"]:9.3f} ms  p90 {result["p90_ms"]:9.3f} ms  p99 {result["p99_ms"]:9.3f} ms  '
+		f'peak RSS {result["peak_rss_kib"] / 1024:7.1f} MiB')
+
+def compare(results, baseline, *, threshold):
+	"""Print how results changed relative to baseline. Return whether any metric regressed by more than threshold."""
+	regressed = False
+	for name, result in results.items():
+		old = baseline['results'].get(name)
+		if old is None or 'skipped' in result or 'skipped' in old:
+			continue
+
+		changes = []
+		for metric in COMPARED_METRICS:
+			if not old[metric]:
+				continue
+			change = (result[metric] - old[metric]) / old[metric]
+			worse = change > threshold if metric in LOWER_IS_BETTER else change < -threshold
+			regressed |= worse
+			changes.append(f'{metric} {change:+.1%}{" REGRESSION" if worse else ""}')
+		print(f'{name:<24} ' + ', '.join(changes))
+	return regressed
+
+def main():
+	from .harness import BENCHMARKS
+	from . import benchmarks  # registers them
+
+	parser = argparse.ArgumentParser(prog='python -m bench', description=__doc__.partition('\n')[0])
+	parser.add_argument('patterns', nargs='*', default=['*'], help='glob patterns of the benchmarks to run')
+	parser.add_argument('--list', action='store_true', help='list the benchmarks and exit')
+	parser.add_argument('--repeat', type=int, default=5, help='how many times to run each input')
+	parser.add_argument('--warmup', type=int, default=1, help='untimed runs of each input beforehand')
+	parser.add_argument('--seed', type=int, default=0, help='seed for generating the corpus')
+	parser.add_argument('--save', metavar='PATH', help='save the results as a JSON baseline')
+	parser.add_argument('--compare', metavar='PATH', help='compare the results to a saved baseline')
+	parser.add_argument(
+		'--threshold', type=float, default=0.1,
+		help='relative change past which --compare reports a regression and exits with status 1')
+	parser.add_argument('--run-one', help=argparse.SUPPRESS)
+	parser.add_argument('--corpus', help=argparse.SUPPRESS)
+	args = parser.parse_args()
+
+	if args.run_one:
+		run_one(args.run_one, args.corpus, repeat=args.repeat, warmup=args.warmup)
+		return
+
+	names = [name for name in BENCHMARKS if any(fnmatch.fnmatchcase(name, pattern) for pattern in args.patterns)]
+	if args.list:
+		print('\n'.join(names))
+		return
+
+	results = run_all(names, seed=args.seed, repeat=args.repeat, warmup=args.warmup)
+
+	if args.save:
+		with open(args.save, 'w') as f:
+			json.dump({
+				'python': platform.python_version(),
+				'machine': platform.machine(),
+				'seed': args.seed,
+				'repeat': args.repeat,
+				'results': results,
+			}, f, indent='\t')
+			f.write('\n')
+
+	if args.compare:
+		with open(args.compare) as f:
+			baseline = json.load(f)
+		print()
+		if compare(results, baseline, threshold=args.threshold):
+			sys.exit(1)
+
+if __name__ == '__main__':
+	main()
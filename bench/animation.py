@@ -0,0 +1,90 @@
+# © 2018–2020 io mintz <io@mintz.cc>
+#
+# Emote Manager is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# Emote Manager is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Emote Manager. If not, see <https://www.gnu.org/licenses/>.
+
+"""report how much each animated GIF optimization strategy saves, and how long it takes
+
+usage: python -m bench.animation [--seed SEED] [GIF or directory of GIFs ...]
+
+Each strategy is applied on top of the previous ones, as resize_until_small does, but every one is tried
+even once the animation fits. The sizes and frame counts are of the whole encoded animation after that strategy.
+Generated noise compresses unlike real emotes, so pass some real animated GIFs to judge the strategies by.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from utils import image
+from . import corpus
+
+def report(name, data):
+	with image.wand.image.Image(blob=data) as original, original.clone() as animation:
+		print(f'{name}: {len(data)} bytes, {len(original.sequence)} frames, {original.width}×{original.height}')
+		candidates = image._animation_candidates(animation)
+		while True:
+			start = time.perf_counter()
+			try:
+				strategy, encoded = next(candidates)
+			except StopIteration:
+				break
+			print_row(strategy, len(data), len(encoded), len(animation.sequence), time.perf_counter() - start)
+
+		start = time.perf_counter()
+		encoded, passes = image._largest_resize_that_fits(animation, len(encoded), optimize=True)
+		print_row(
+			f'downscale ({passes} passes)', len(data), len(encoded), len(animation.sequence),
+			time.perf_counter() - start)
+
+def print_row(strategy, original_size, size, frames, seconds):
+	saved = original_size - size
+	print(
+		f'\t{strategy:<24} {size:>10} bytes  saved {saved:>10} bytes ({saved / original_size:6.1%})  '
+		f'{frames:>4} frames  {seconds * 1000:9.1f} ms{"  fits" if size <= image.MAX_EMOTE_SIZE else ""}')
+
+def gif_paths(paths):
+	"""expand any directories in paths to the GIFs directly inside them"""
+	for path in paths:
+		if not os.path.isdir(path):
+			yield path
+			continue
+		for name in sorted(os.listdir(path)):
+			if name.lower().endswith('.gif'):
+				yield os.path.join(path, name)
+
+def main():
+	parser = argparse.ArgumentParser(prog='python -m bench.animation', description=__doc__.partition('\n')[0])
+	parser.add_argument(
+		'files', nargs='*',
+		help='animated GIFs, or directories of them, to report on in addition to the generated ones')
+	parser.add_argument('--seed', type=int, default=0, help='seed for generating the corpus')
+	args = parser.parse_args()
+
+	try:
+		image._import_wand()
+	except (ImportError, OSError):
+		sys.exit('ImageMagick is required to optimize animations')
+	if not image._can_shrink_animations():
+		sys.exit('this version of ImageMagick lacks the functions needed to optimize animations')
+
+	for item in corpus.generate(args.seed):
+		if item.frames > 1:
+			report(item.name, item.data)
+	for path in gif_paths(args.files):
+		with open(path, 'rb') as f:
+			report(path, f.read())
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,114 @@
+# © 2018–2020 io mintz <io@mintz.cc>
+#
+# Emote Manager is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# Emote Manager is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Emote Manager. If not, see <https://www.gnu.org/licenses/>.
+
+"""the benchmarks themselves"""
+
+import asyncio
+import collections
+import datetime
+import io
+import itertools
+import types
+
+from utils import archive, image
+from . import corpus as corpus_
+from .harness import Workload, benchmark
+
+def wand_missing():
+	try:
+		image._import_wand()
+	except (ImportError, OSError):
+		return 'ImageMagick is not available'
+	return None
+
+@benchmark('image.mime_type')
+def mime_type(corpus):
+	return Workload(corpus, lambda item: image.mime_type_for_image(item.data), lambda item: len(item.data))
+
+@benchmark('image.probe')
+def probe(corpus):
+	return Workload(corpus, lambda item: image.probe(item.data), lambda item: len(item.data))
+
+@benchmark('image.resize')
+def resize(corpus):
+	"""only the images which actually need resizing"""
+	reason = wand_missing()
+	if reason:
+		return reason
+	return Workload(
+		[item for item in corpus if len(item.data) > image.MAX_EMOTE_SIZE],
+		lambda item: image.resize_until_small(io.BytesIO(item.data)),
+		lambda item: len(item.data))
+
+@benchmark('image.convert_to_gif')
+def convert_to_gif(corpus):
+	reason = wand_missing()
+	if reason:
+		return reason
+	return Workload(
+		[item for item in corpus if item.format != 'gif' and len(item.data) <= image.MAX_EMOTE_SIZE],
+		lambda item: image.convert_to_gif(io.BytesIO(item.data)),
+		lambda item: len(item.data))
+
+def consume(iterable):
+	collections.deque(iterable, maxlen=0)
+
+@benchmark('archive.extract_zip')
+def extract_zip(corpus):
+	return Workload(
+		[corpus_.make_zip(corpus)],
+		lambda data: consume(archive.extract_zip(io.BytesIO(data))),
+		len)
+
+@benchmark('archive.extract_tar')
+def extract_tar(corpus):
+	return Workload(
+		[corpus_.make_tar(corpus)],
+		lambda data: consume(archive.extract_tar(io.BytesIO(data))),
+		len)
+
+FakeEmote = collections.namedtuple('FakeEmote', 'name animated created_at data')
+
+@benchmark('export.archive_emotes')
+def archive_emotes(corpus):
+	"""the zip packing loop of the export command, for a full server of emotes, without any downloading"""
+	from cogs.emote import Emotes
+
+	class Exporter:
+		ZIP_OVERHEAD_BYTES = Emotes.ZIP_OVERHEAD_BYTES
+		export_filenames = staticmethod(Emotes.export_filenames)
+		archive_emotes = Emotes.archive_emotes
+
+		async def download_emotes(self, named_emotes, progress):
+			for emote, name in named_emotes:
+				yield emote, name, emote.data
+
+	fitting = [item for item in corpus if len(item.data) <= image.MAX_EMOTE_SIZE]
+	created_at = datetime.datetime(2020, 1, 1)
+	emotes = [
+		FakeEmote(f'emote{i}', item.format == 'gif', created_at, item.data)
+		for i, item in zip(range(100), itertools.cycle(fitting))]
+	context = types.SimpleNamespace(guild=types.SimpleNamespace(id=0, filesize_limit=8 * 2**20))
+	exporter = Exporter()
+	loop = asyncio.new_event_loop()
+
+	async def export():
+		async for file in exporter.archive_emotes(context, emotes, progress=None):
+			file.close()
+
+	return Workload(
+		[emotes],
+		lambda _: loop.run_until_complete(export()),
+		lambda emotes: sum(len(emote.data) for emote in emotes))
@@ -0,0 +1,121 @@
+# © 2018–2020 io mintz <io@mintz.cc>
+#
+# Emote Manager is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# Emote Manager is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Emote Manager. If not, see <https://www.gnu.org/licenses/>.
+
+"""deterministic, generated images and archives to benchmark against"""
+
+import collections
+import io
+import random
+import struct
+import tarfile
+import zipfile
+import zlib
+
+CorpusImage = collections.namedtuple('CorpusImage', 'name format width height frames data')
+
+# (name, width, height, frames, noise). Noisy images compress poorly, so they're the ones that need resizing.
+SPECS = (
+	('tiny', 32, 32, 1, 0.1),
+	('small', 128, 128, 1, 0.2),
+	('medium', 256, 256, 1, 0.5),
+	('large', 512, 512, 1, 1.0),
+	('huge', 1024, 1024, 1, 1.0),
+	('anim-small', 64, 64, 8, 0.2),
+	('anim-large', 256, 256, 24, 0.6),
+)
+
+def pixels(width, height, noise, rng):
+	"""RGB pixels: a diagonal gradient, with a fraction of them replaced by random noise."""
+	row_gradient = bytes(range(256)) * (width // 256 + 2)
+	rows = []
+	for y in range(height):
+		row = bytearray(width * 3)
+		row[0::3] = row_gradient[y % 256:][:width]
+		row[1::3] = row_gradient[(y * 2) % 256:][:width]
+		row[2::3] = bytes([y % 256]) * width
+		n = int(len(row) * noise)
+		if n:
+			offset = rng.randrange(len(row) - n + 1)
+			row[offset:offset + n] = rng.getrandbits(n * 8).to_bytes(n, 'little')
+		rows.append(bytes(row))
+	return rows
+
+def encode_png(width, height, rows) -> bytes:
+	"""a minimal 8 bit RGB PNG encoder, so that the corpus doesn't depend on ImageMagick"""
+	def chunk(type, data):
+		return struct.pack('!I', len(data)) + type + data + struct.pack('!I', zlib.crc32(type + data))
+
+	raw = b''.join(b'\0' + row for row in rows)  # filter type 0 (None) for every row
+	return b''.join((
+		b'\x89PNG\r\n\x1a\n',
+		chunk(b'IHDR', struct.pack('!IIBBBBB', width, height, 8, 2, 0, 0, 0)),
+		chunk(b'IDAT', zlib.compress(raw, 6)),
+		chunk(b'IEND', b'')))
+
+def generate(seed=0):
+	"""Return a list of CorpusImages.
+
+	PNGs are always generated. JPEG, WEBP and GIF (including animated GIF) versions need ImageMagick,
+	and are left out if it's unavailable.
+	"""
+	rng = random.Random(seed)
+	try:
+		import wand.image
+	except (ImportError, OSError):
+		wand = None
+
+	images = []
+	for name, width, height, frames, noise in SPECS:
+		if frames > 1 and wand is None:
+			continue
+		frame_pngs = [encode_png(width, height, pixels(width, height, noise, rng)) for _ in range(frames)]
+		if frames == 1:
+			images.append(CorpusImage(f'{name}.png', 'png', width, height, 1, frame_pngs[0]))
+		if wand is None:
+			continue
+
+		if frames == 1:
+			with wand.image.Image(blob=frame_pngs[0]) as image:
+				for format in 'jpeg', 'webp', 'gif':
+					with image.convert(format) as converted:
+						images.append(CorpusImage(
+							f'{name}.{format}', format, width, height, 1, converted.make_blob()))
+			continue
+
+		with wand.image.Image() as animation:
+			for png in frame_pngs:
+				with wand.image.Image(blob=png) as frame:
+					frame.delay = 5
+					animation.sequence.append(frame)
+			animation.format = 'gif'
+			images.append(CorpusImage(f'{name}.gif', 'gif', width, height, frames, animation.make_blob()))
+
+	return images
+
+def make_zip(images, *, compression=zipfile.ZIP_STORED) -> bytes:
+	out = io.BytesIO()
+	with zipfile.ZipFile(out, 'w', compression=compression) as zip:
+		for image in images:
+			zip.writestr(image.name, image.data)
+	return out.getvalue()
+
+def make_tar(images) -> bytes:
+	out = io.BytesIO()
+	with tarfile.open(fileobj=out, mode='w') as tar:
+		for image in images:
+			info = tarfile.TarInfo(image.name)
+			info.size = len(image.data)
+			tar.addfile(info, io.BytesIO(image.data))
+	return out.getvalue()
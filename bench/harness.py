@@ -0,0 +1,75 @@
+# © 2018–2020 io mintz <io@mintz.cc>
+#
+# Emote Manager is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# Emote Manager is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Emote Manager. If not, see <https://www.gnu.org/licenses/>.
+
+"""timing, memory measurement, and the registry of benchmarks"""
+
+import collections
+import gc
+import resource
+import time
+
+# name -> function(corpus) returning a Workload, or a str explaining why the benchmark can't run
+BENCHMARKS = {}
+
+"""items: the inputs. run: performs one operation on one item. size: how many bytes one item represents."""
+Workload = collections.namedtuple('Workload', 'items run size')
+
+def benchmark(name):
+	def decorator(func):
+		BENCHMARKS[name] = func
+		return func
+	return decorator
+
+def percentile(sorted_values, fraction):
+	"""nearest-rank percentile of an already sorted list"""
+	index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values)) - 1))
+	return sorted_values[index]
+
+def peak_rss_kib():
+	# kibibytes on Linux, but bytes on macOS
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def measure(workload: Workload, *, repeat=5, warmup=1) -> dict:
+	"""Run every item of workload repeat times, after warmup untimed runs, and summarize the timings."""
+	for _ in range(warmup):
+		for item in workload.items:
+			workload.run(item)
+
+	gc.collect()
+	rss_before = peak_rss_kib()
+	latencies = []
+	total_bytes = 0
+	for _ in range(repeat):
+		for item in workload.items:
+			start = time.perf_counter()
+			workload.run(item)
+			latencies.append(time.perf_counter() - start)
+			total_bytes += workload.size(item)
+
+	latencies.sort()
+	total = sum(latencies)
+	return {
+		'ops': len(latencies),
+		'total_s': total,
+		'ops_per_s': len(latencies) / total if total else float('inf'),
+		'mib_per_s': total_bytes / 2**20 / total if total else float('inf'),
+		'p50_ms': percentile(latencies, 0.50) * 1000,
+		'p90_ms': percentile(latencies, 0.90) * 1000,
+		'p99_ms': percentile(latencies, 0.99) * 1000,
+		'max_ms': latencies[-1] * 1000,
+		'peak_rss_kib': peak_rss_kib(),
+		# how much the benchmark itself raised the peak, beyond loading the corpus and the code under test
+		'rss_growth_kib': peak_rss_kib() - rss_before,
+	}
@@ -32,9 +32,12 @@ class Bot(Bot):
 	startup_extensions = (
 		'cogs.emote',
 		'cogs.meta',
-		'bot_bin.debug',
 		'bot_bin.misc',
 		'bot_bin.systemd',
+	)
+	# owner-only debugging tools, which are loaded once the bot is ready if defer_extensions is enabled
+	deferred_extensions = (
+		'bot_bin.debug',
 		'jishaku',
 	)
 
@@ -57,6 +60,22 @@ class Bot(Bot):
 		utils.SUCCESS_EMOJIS = utils.misc.SUCCESS_EMOJIS = (
 			self.config.get('response_emojis', {}).get('success', default))
 
+	def load_extensions(self):
+		super().load_extensions()
+		if self.config.get('defer_extensions', True):
+			self.loop.create_task(self.load_deferred_extensions())
+		else:
+			for extension in self.deferred_extensions:
+				self.load_extension(extension)
+
+	async def load_deferred_extensions(self):
+		await self.wait_until_ready()
+		for extension in self.deferred_extensions:
+			try:
+				self.load_extension(extension)
+			except commands.ExtensionError:
+				logger.exception('Failed to load deferred extension %s', extension)
+
 def main():
 	import sys
 
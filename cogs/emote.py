@@ -17,18 +17,17 @@ import asyncio
 import cgi
 import collections
 import contextlib
+import functools
+import html
 import io
 import logging
-import operator
 import posixpath
-import re
 import traceback
 import urllib.parse
 import zipfile
 import warnings
 import weakref
 import time
-import os
 import typing
 
 import aioec
@@ -41,8 +40,8 @@ import utils
 import utils.archive
 import utils.image
 from utils import errors
-from utils.converter import emote_type_filter_default
-from utils.paginator import ListPaginator
+from utils.converter import all_emote_types, emote_type_filter_default
+from utils.paginator import ComponentListPaginator, ListPaginator, PaginatorDispatcher
 
 logger = logging.getLogger(__name__)
 
@@ -52,6 +51,46 @@ warnings.filterwarnings('ignore', module='zipfile', category=UserWarning, messag
 class UserCancelledError(commands.UserInputError):
 	pass
 
+# An emote to be added by Emotes.add_many. Exactly one of url, image, or error is given.
+# error is a message to report instead of adding the emote.
+EmoteJob = collections.namedtuple('EmoteJob', 'name url image reason error', defaults=(None,) * 4)
+
+# What show displays about an emote that only fetching it from the API tells us.
+EmoteMetadata = collections.namedtuple('EmoteMetadata', 'user created_at')
+
+# Emotes.html_archive fills in server, part, date, and time.
+HTML_ARCHIVE_HEADER = (
+	'<!DOCTYPE html>\n<html>\n<head>\n'
+	'\t<!-- Generated by Emote Manager https://github.com/saucylegs/EmoteManager -->\n'
+	'\t<meta charset="UTF-8">\n'
+	'\t<meta name="viewport" content="width=device-width, initial-scale=1.0">\n'
+	'\t<meta name="robots" content="noindex">\n'
+	'\t<style>\n'
+	'\t\tbody {\n'
+	'\t\t\tfont-family: system-ui, -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Ubuntu, "Open Sans", sans-serif;\n'
+	'\t\t\tfont-size: 1.25rem;\n'
+	'\t\t\tmargin: 8px;\n'
+	'\t\t\tbackground-color: #2f3136;\n'
+	'\t\t\tcolor: #ffffff;\n'
+	'\t\t}\n'
+	'\t\th1, p {\n'
+	'\t\t\tmargin: 0.5rem 0;\n'
+	'\t\t}\n'
+	'\t\timg {\n'
+	'\t\t\tmax-width: 64px;\n'
+	'\t\t\tmax-height: 64px;\n'
+	'\t\t\tmargin: 5px 2px;\n'
+	'\t\t\tvertical-align: middle;\n'
+	'\t\t}\n'
+	'\t</style>\n'
+	'\t<title>%(server)s Emote Archive%(part)s (%(date)s)</title>\n'
+	'\t<meta name="og:title" content="%(server)s Emote Archive%(part)s (%(date)s)">\n'
+	'</head>\n<body>\n'
+	'\t<h1>%(server)s Emote Archive%(part)s</h1>\n'
+	'\t<p>Archived on %(date)s at %(time)s</p>\n'
+	'\t<p>On some browsers, you can hover over an emote to see its name.</p>')
+HTML_ARCHIVE_FOOTER = '\n</body>\n</html>'
+
 class Emotes(commands.Cog):
 	IMAGE_MIMETYPES = {'image/png', 'image/jpeg', 'image/gif', 'image/webp'}
 	# TAR_MIMETYPES = {'application/x-tar', 'application/x-xz', 'application/gzip', 'application/x-bzip2'}
@@ -59,37 +98,91 @@ class Emotes(commands.Cog):
 	ZIP_MIMETYPES = {'application/zip', 'application/octet-stream', 'application/x-zip-compressed', 'multipart/x-zip'}
 	ARCHIVE_MIMETYPES = TAR_MIMETYPES | ZIP_MIMETYPES
 	ZIP_OVERHEAD_BYTES = 30
+	FETCH_CHUNK_SIZE = 64 * 2**10
+	# enough to hold the magic number of any image type we accept
+	SNIFF_BYTES = 16
 
 	def __init__(self, bot):
 		self.bot = bot
 
-		connector = None
-		socks5_url = self.bot.config.get('socks5_proxy_url')
-		if socks5_url:
-			from aiohttp_socks import SocksConnector
-			connector = SocksConnector.from_url(socks5_url, rdns=True)
+		self.connection_pool = utils.http.ConnectionPool(
+			limit=self.bot.config.get('http_connection_limit', 100),
+			limit_per_host=self.bot.config.get('http_connection_limit_per_host', 10),
+			keepalive_timeout=self.bot.config.get('http_keepalive_timeout', 30),
+			dns_cache_ttl=self.bot.config.get('http_dns_cache_ttl', 300),
+			proxy_url=self.bot.config.get('socks5_proxy_url'),
+			proxy_all=self.bot.config.get('use_socks5_for_all_connections', False),
+			loop=self.bot.loop)
 
 		self.http = aiohttp.ClientSession(
 			loop=self.bot.loop,
 			read_timeout=self.bot.config.get('http_read_timeout', 60),
-			connector=connector if self.bot.config.get('use_socks5_for_all_connections') else None,
+			connector=self.connection_pool.connector,
+			connector_owner=False,
+			trace_configs=[self.connection_pool.trace_config],
 			headers={
 				'User-Agent':
 					self.bot.config['user_agent'] + ' '
 					+ self.bot.http.user_agent
 			})
 
-		self.aioec = aioec.Client(
-			loop=self.bot.loop,
-			connector=connector,
-			base_url=self.bot.config.get('ec_api_base_url'))
+		self.aioec = utils.ec.CachedECClient(
+			utils.ec.SharedConnectorClient(
+				loop=self.bot.loop,
+				connector=self.connection_pool.proxy_connector,
+				trace_configs=[self.connection_pool.trace_config],
+				base_url=self.bot.config.get('ec_api_base_url')),
+			ttl=self.bot.config.get('ec_cache_ttl', 600),
+			max_entries=self.bot.config.get('ec_cache_max_entries', 1000),
+			concurrency=self.bot.config.get('ec_lookup_concurrency', 4),
+			loop=self.bot.loop)
 		# keep track of paginators so we can end them when the cog is unloaded
 		self.paginators = weakref.WeakSet()
+		self.paginator_dispatcher = PaginatorDispatcher.install(self.bot)
+		if self.bot.config.get('paginator') == 'buttons':
+			self.ListPaginator = ComponentListPaginator
+		else:
+			self.ListPaginator = ListPaginator
+		# guild ID -> utils.emote.EmoteIndex, built on first use and rebuilt whenever the guild's emotes change
+		self.emote_indexes = {}
+
+		self.image_cache = None
+		cache_path = self.bot.config.get('emote_cache_path')
+		if cache_path:
+			self.image_cache = utils.cache.EmoteImageCache(
+				cache_path,
+				max_bytes=self.bot.config.get('emote_cache_max_bytes', 512 * 2**20),
+				memory_bytes=self.bot.config.get('emote_cache_memory_bytes', 32 * 2**20),
+				loop=self.bot.loop)
+
+		# (guild ID, emote ID) -> EmoteMetadata, or None if the emote isn't in that guild
+		self.emote_metadata = utils.cache.TTLCache(
+			ttl=self.bot.config.get('emote_metadata_ttl', 3600),
+			max_entries=self.bot.config.get('emote_metadata_max_entries', 10_000),
+			loop=self.bot.loop)
+
+		# guild cooldowns only stop a single guild from spamming heavy commands. This keeps all of them together in check.
+		self.admission = utils.admission.AdmissionController(
+			{'image': 2, 'download': 4, 'archive': 2, **self.bot.config.get('admission_budgets', {})},
+			per_guild=self.bot.config.get('admission_per_guild', 1),
+			loop=self.bot.loop)
+
+		self.image_pool = utils.image.configure_pool(
+			size=self.bot.config.get('image_workers', 2),
+			timeout=self.bot.config.get('image_timeout', 60),
+			max_jobs=self.bot.config.get('image_worker_max_jobs', 100),
+			limits=utils.image.DEFAULT_IMAGE_LIMITS._replace(**self.bot.config.get('image_limits', {})))
+		self.bot.loop.create_task(self.image_pool.start())
 
 	def cog_unload(self):
+		self.paginator_dispatcher.uninstall()
+
 		async def close():
 			await self.http.close()
 			await self.aioec.close()
+			# the sessions above only use its connectors, so they're closed last
+			await self.connection_pool.close()
+			await self.image_pool.close()
 
 			for paginator in self.paginators:
 				await paginator.stop()
@@ -126,6 +219,28 @@ class Emotes(commands.Cog):
 
 		return True
 
+	def emote_index(self, guild) -> utils.emote.EmoteIndex:
+		try:
+			return self.emote_indexes[guild.id]
+		except KeyError:
+			index = self.emote_indexes[guild.id] = utils.emote.EmoteIndex(guild.emojis)
+			return index
+
+	@commands.Cog.listener()
+	async def on_guild_emojis_update(self, guild, before, after):
+		self.emote_indexes[guild.id] = utils.emote.EmoteIndex(after)
+		for emote in {*before, *after}:
+			self.emote_metadata.invalidate((guild.id, emote.id))
+
+	@commands.Cog.listener()
+	async def on_guild_available(self, guild):
+		# we may have missed some updates while it was unavailable
+		self.emote_indexes.pop(guild.id, None)
+
+	@commands.Cog.listener()
+	async def on_guild_remove(self, guild):
+		self.emote_indexes.pop(guild.id, None)
+
 	@commands.Cog.listener()
 	async def on_command_error(self, context, error):
 		if isinstance(error, errors.EmoteManagerError):
@@ -161,20 +276,14 @@ class Emotes(commands.Cog):
 	async def add_these(self, context, *emotes):
 		"""Add a bunch of custom emotes."""
 
-		ran = False
 		# we could use *emotes: discord.PartialEmoji here but that would require spaces between each emote.
 		# and would fail if any arguments were not valid emotes
-		for match in re.finditer(utils.emote.RE_CUSTOM_EMOTE, ''.join(emotes)):
-			ran = True
-			animated, name, id = match.groups()
-			image_url = utils.emote.url(id, animated=animated)
-			async with context.typing():
-				message = await self.add_safe(context, name, image_url, context.author.id)
-				await context.send(message)
+		jobs = [EmoteJob(emote.name, url=emote.url) for emote in utils.emote.find_custom_emotes(' '.join(emotes))]
 
-		if not ran:
+		if not jobs:
 			return await context.send('Error: no custom emotes were provided.')
 
+		await self.add_many(context, jobs)
 		await context.message.add_reaction(utils.SUCCESS_EMOJIS[True])
 
 	@classmethod
@@ -183,8 +292,8 @@ class Emotes(commands.Cog):
 			return cls.parse_add_command_attachment(context, args)
 
 		elif len(args) == 1:
-			match = utils.emote.RE_CUSTOM_EMOTE.match(args[0])
-			if match is None:
+			emote = utils.emote.parse_custom_emote(args[0])
+			if emote is None:
 				raise commands.BadArgument(
 					'Error: I expected a custom emote as the first argument, '
 					'but I got something else. '
@@ -192,18 +301,17 @@ class Emotes(commands.Cog):
 					'you need to provide a name as the first argument, like this:\n'
 					'`{}add NAME_HERE URL_HERE`'.format(context.prefix))
 			else:
-				animated, name, id = match.groups()
-				url = utils.emote.url(id, animated=animated)
+				name, url = emote.name, emote.url
 
 			return name, url
 
 		elif len(args) >= 2:
 			name = args[0]
-			match = utils.emote.RE_CUSTOM_EMOTE.match(args[1])
-			if match is None:
+			emote = utils.emote.parse_custom_emote(args[1])
+			if emote is None:
 				url = utils.strip_angle_brackets(args[1])
 			else:
-				url = utils.emote.url(match['id'], animated=match['animated'])
+				url = emote.url
 
 			return name, url
 
@@ -231,28 +339,46 @@ class Emotes(commands.Cog):
 		The list of possible emotes you can copy is here:
 		https://ec.emote.bot/list
 		"""
-		if names:
-			for name in (name,) + names:
-				await context.invoke(self.add_from_ec, name)
-			return
-
-		name = name.strip(':')
-		try:
-			emote = await self.aioec.emote(name)
-		except aioec.NotFound:
-			return await context.send("Emote not found in Emote Collector's database.")
-		except aioec.HttpException as exception:
-			return await context.send(
-				f'Error: the Emote Collector API returned status code {exception.status}')
-
-		reason = (
-			f'Added from Emote Collector by {utils.format_user(self.bot, context.author.id)}. '
-			f'Original emote author: {utils.format_user(self.bot, emote.author)}')
-
+		names = [name.strip(':') for name in (name,) + names]
+		# look up every emote before uploading any, so that the lookups all happen at once
 		async with context.typing():
-			message = await self.add_safe(context, name, emote.url, context.author.id, reason=reason)
+			emotes = await self.aioec.emotes(names)
+
+		def jobs():
+			for name, emote in zip(names, emotes):
+				if isinstance(emote, aioec.NotFound):
+					yield EmoteJob(name, error=f"{name}: Emote not found in Emote Collector's database.")
+					continue
+				if isinstance(emote, aioec.HttpException):
+					yield EmoteJob(
+						name,
+						error=f'{name}: Error: the Emote Collector API returned status code {emote.status}')
+					continue
+
+				reason = (
+					f'Added from Emote Collector by {utils.format_user(self.bot, context.author.id)}. '
+					f'Original emote author: {utils.format_user(self.bot, emote.author)}')
+				yield EmoteJob(name, url=emote.url, reason=reason)
+
+		await self.add_many(context, jobs())
+
+	@contextlib.asynccontextmanager
+	async def admitted(self, context, *job_classes):
+		"""Wait for a turn to run a heavy command which needs job_classes, telling the user if they have to wait."""
+		queued_message = None
+
+		async def on_queued(position):
+			nonlocal queued_message
+			with contextlib.suppress(discord.HTTPException):
+				queued_message = await context.send(
+					f'The bot is busy with other servers right now. Your request is number {position} in line, '
+					'and will start automatically.')
 
-		await context.send(message)
+		async with self.admission.admit(context.guild.id, job_classes, on_queued=on_queued):
+			if queued_message is not None:
+				with contextlib.suppress(discord.HTTPException):
+					await queued_message.delete()
+			yield
 
 	@public
 	@emote_type_filter_default
@@ -272,16 +398,54 @@ class Emotes(commands.Cog):
 		if not emotes:
 			raise commands.BadArgument('No emotes of that type were found in this server.')
 
-		async with context.typing():
-			async for zip_file in self.archive_emotes(context, emotes):
-				await context.send(file=zip_file)
+		async with self.admitted(context, 'download', 'archive'):
+			progress = utils.progress.ProgressMessage(context)
+			try:
+				async with context.typing():
+					async for zip_file in self.archive_emotes(context, emotes, progress):
+						await context.send(file=zip_file)
+			finally:
+				await progress.finish()
 
-	async def archive_emotes(self, context, emotes):
+	async def archive_emotes(self, context, emotes, progress):
+		"""Download emotes and yield zip files of them, each one as soon as it reaches the guild's file size limit."""
 		filesize_limit = context.guild.filesize_limit
+		count = 1
+		out = zip = None
+
+		def finish_zip():
+			zip.close()
+			out.seek(0)
+			return discord.File(out, f'emotes-{context.guild.id}-{count}.zip')
+
+		async for emote, name, data in self.download_emotes(self.export_filenames(emotes), progress):
+			est_zip_overhead = len(name) + self.ZIP_OVERHEAD_BYTES
+			est_size_in_zip = est_zip_overhead + len(data)
+			if est_size_in_zip >= filesize_limit:
+				progress.add(f'{emote} could not be added because it alone would exceed the file size limit.')
+				continue
+
+			if zip is not None and out.tell() + est_size_in_zip >= filesize_limit:
+				# adding this emote would bring us over the file size limit
+				yield finish_zip()
+				count += 1
+				zip = None
+
+			if zip is None:
+				out = io.BytesIO()
+				zip = zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_STORED)
+
+			zinfo = zipfile.ZipInfo(name, date_time=emote.created_at.timetuple()[:6])
+			zip.writestr(zinfo, data)
+
+		if zip is not None:
+			yield finish_zip()
+
+	@staticmethod
+	def export_filenames(emotes):
+		"""Yield (emote, filename) pairs, such that no two files in a zip have the same name."""
 		discrims = collections.defaultdict(int)
-		downloaded = collections.deque()
-		async def download(emote):
-			# don't put two files in the zip with the same name
+		for emote in emotes:
 			discrims[emote.name] += 1
 			discrim = discrims[emote.name]
 			if discrim == 1:
@@ -289,53 +453,57 @@ class Emotes(commands.Cog):
 			else:
 				name = f'{emote.name}-{discrim}'
 
-			name = f'{name}.{"gif" if emote.animated else "png"}'
+			yield emote, f'{name}.{"gif" if emote.animated else "png"}'
 
-			# place some level of trust on discord's CDN to actually give us images
-			data = await self.fetch_safe(str(emote.url), validate_headers=False)
-			if type(data) is str:  # error case
-				await context.send(f'{emote}: {data}')
-				return
+	async def download_emotes(self, named_emotes, progress):
+		"""Download the images of (emote, filename) pairs concurrently, yielding (emote, filename, data) in completion order.
 
-			est_zip_overhead = len(name) + self.ZIP_OVERHEAD_BYTES
-			est_size_in_zip = est_zip_overhead + len(data)
-			if est_size_in_zip >= filesize_limit:
-				self.bot.loop.create_task(
-					context.send(f'{emote} could not be added because it alone would exceed the file size limit.')
-				)
-				return
-
-			downloaded.append((name, emote.created_at, est_size_in_zip, data))
-
-		await utils.gather_or_cancel(*map(download, emotes))
+		At most `export_concurrency` downloads are in flight at once.
+		An emote that fails to download is reported to progress and skipped, rather than aborting the rest.
+		"""
+		concurrency = self.bot.config.get('export_concurrency', 8)
+		# bounded so that downloads stay only slightly ahead of whoever is consuming them
+		results = asyncio.Queue(concurrency)
+		named_emotes = iter(named_emotes)
+		done = object()
+
+		async def download_worker():
+			# every worker pulls from the same iterator, so each emote is downloaded exactly once
+			for emote, name in named_emotes:
+				try:
+					# place some level of trust on discord's CDN to actually give us images
+					data = await self.fetch_safe(str(emote.url), validate_headers=False)
+				except errors.EmoteManagerError as exc:
+					data = str(exc)
 
-		count = 1
-		while True:
-			out = io.BytesIO()
-			with zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_STORED) as zip:
-				while True:
-					try:
-						item = downloaded.popleft()
-					except IndexError:
-						break
+				if type(data) is str:  # error case
+					progress.add(f'{emote}: {data}')
+					continue
 
-					name, created_at, est_size, image_data = item
+				await results.put((emote, name, data))
 
-					if out.tell() + est_size >= filesize_limit:
-						# adding this emote would bring us over the file size limit
-						downloaded.appendleft(item)
-						break
+		workers = [self.bot.loop.create_task(download_worker()) for _ in range(concurrency)]
 
-					zinfo = zipfile.ZipInfo(name, date_time=created_at.timetuple()[:6])
-					zip.writestr(zinfo, image_data)
+		async def finish():
+			await asyncio.wait(workers)
+			await results.put(done)
 
-				if out.tell() == 0:
-					# no emotes were written
+		finisher = self.bot.loop.create_task(finish())
+		try:
+			while True:
+				item = await results.get()
+				if item is done:
 					break
+				yield item
 
-			out.seek(0)
-			yield discord.File(out, f'emotes-{context.guild.id}-{count}.zip')
-			count += 1
+			# propagate any unexpected errors from the workers
+			for worker in workers:
+				worker.result()
+			logger.debug('connection pool after downloading emotes: %s', self.connection_pool.stats())
+		finally:
+			for task in workers:
+				task.cancel()
+			finisher.cancel()
 
 	@commands.command(name='import', aliases=['add-zip', 'add-tar', 'add-from-zip', 'add-from-tar'])
 	@commands.cooldown(1, 20, type=commands.BucketType.guild)
@@ -352,44 +520,162 @@ class Emotes(commands.Cog):
 			raise commands.BadArgument('A URL or attachment must be given.')
 
 		url = url or context.message.attachments[0].url
-		async with context.typing():
-			archive = await self.fetch_safe(url, valid_mimetypes=self.ARCHIVE_MIMETYPES)
-		if type(archive) is str:  # error case
-			await context.send(archive)
-			return
+		archive = utils.archive.SpooledArchive(self.bot.config.get('archive_spool_size', 8 * 2**20))
+		try:
+			async with self.admitted(context, 'download', 'archive'), context.typing():
+				result = await self.fetch_safe(url, valid_mimetypes=self.ARCHIVE_MIMETYPES, file=archive)
+			if type(result) is str:  # error case
+				await context.send(result)
+				return
+
+			# add_many admits each batch of extraction and resizing separately, leaving the uploads out of it
+			await self.add_from_archive(context, archive)
+		finally:
+			archive.close()
 
-		await self.add_from_archive(context, archive)
 		with contextlib.suppress(discord.HTTPException):
 			# so they know when we're done
 			await context.message.add_reaction(utils.SUCCESS_EMOJIS[True])
 
-	async def add_from_archive(self, context, archive):
+	async def add_from_archive(self, context, archive: utils.archive.SpooledArchive):
 		limit = 50_000_000  # prevent someone from trying to make a giant compressed file
-		async for name, img, error in utils.archive.extract_async(io.BytesIO(archive), size_limit=limit):
+		with archive.open() as fp:
+			await self._add_from_archive(context, fp, size_limit=limit)
+
+	async def _add_from_archive(self, context, fp, *, size_limit):
+		async def jobs():
+			async for name, img, error in utils.archive.extract_async(fp, size_limit=size_limit):
+				if error is None:
+					try:
+						utils.image.mime_type_for_image(img)
+					except errors.InvalidImageError:
+						continue
+					yield EmoteJob(self.format_emote_filename(posixpath.basename(name)), image=img)
+					continue
+
+				if isinstance(error, errors.FileTooBigError):
+					yield EmoteJob(name, error=(
+						f'{name}: file too big. '
+						f'The limit is {humanize.naturalsize(error.limit)} '
+						f'but this file is {humanize.naturalsize(error.size)}.'))
+					continue
+
+				yield EmoteJob(name, error=f'{name}: {error}')
+
+		await self.add_many(context, jobs(), job_classes=('archive', 'image'))
+
+	async def add_many(
+		self, context, jobs: typing.Union[typing.Iterable, typing.AsyncIterable], *,
+		job_classes=('download', 'image'),
+	):
+		"""Add many emotes, reporting the result of each one in a single progress message.
+
+		Up to `upload_prepare_concurrency` images are downloaded and resized at once, ahead of the uploads.
+		They are prepared in batches of up to `upload_prepare_ahead`, each under its own admission for job_classes,
+		which is released before the batch is uploaded, since uploads can be held up by rate limits for minutes.
+		Reading jobs counts as preparing them, so an archive being extracted into jobs is covered too.
+		The uploads themselves happen one at a time, in order,
+		since every emote creation in a guild shares one rate limit bucket, which discord.py already waits on.
+		Free slots are counted locally so that we can stop as soon as the guild is full.
+		"""
+		if not hasattr(jobs, '__aiter__'):
+			jobs = utils.as_async_iterable(jobs)
+		jobs = jobs.__aiter__()
+
+		concurrency = self.bot.config.get('upload_prepare_concurrency', 4)
+		ahead = max(concurrency, self.bot.config.get('upload_prepare_ahead', 20))
+		prepared = asyncio.Queue()
+		preparing = asyncio.Semaphore(concurrency)
+		progress = utils.progress.ProgressMessage(context)
+		counts = self.emote_index(context.guild).counts.copy()
+		# every prepare task that hasn't been consumed yet, whether or not it made it into the queue
+		pending = set()
+		consumed = asyncio.Event()
+
+		async def schedule():
 			try:
-				utils.image.mime_type_for_image(img)
-			except errors.InvalidImageError:
-				continue
-			if error is None:
-				name = self.format_emote_filename(posixpath.basename(name))
-				async with context.typing():
-					message = await self.add_safe_bytes(context, name, context.author.id, img)
-				await context.send(message)
-				continue
+				exhausted = False
+				while not exhausted:
+					# let the uploads work through most of the last batch before admitting the next one
+					while len(pending) > ahead // 2:
+						consumed.clear()
+						await consumed.wait()
+
+					async with self.admitted(context, *job_classes):
+						while len(pending) < ahead:
+							try:
+								job = await jobs.__anext__()
+							except StopAsyncIteration:
+								exhausted = True
+								break
+							await preparing.acquire()
+							task = self.bot.loop.create_task(self.prepare_emote(job))
+							pending.add(task)
+							task.add_done_callback(lambda _: preparing.release())
+							prepared.put_nowait(task)
+						await asyncio.gather(*(task for task in pending if not task.done()), return_exceptions=True)
+			finally:
+				prepared.put_nowait(None)
+
+		scheduler = self.bot.loop.create_task(schedule())
+		try:
+			async with context.typing():
+				while True:
+					task = await prepared.get()
+					if task is None:
+						break
 
-			if isinstance(error, errors.FileTooBigError):
-				await context.send(
-					f'{name}: file too big. '
-					f'The limit is {humanize.naturalsize(error.limit)} '
-					f'but this file is {humanize.naturalsize(error.size)}.')
-				continue
+					job, image_data, message = await task
+					pending.discard(task)
+					consumed.set()
+					if image_data is not None:
+						message = await self.add_safe_bytes(
+							context, job.name, context.author.id, image_data,
+							reason=job.reason, counts=counts, resized=True)
+					progress.add(message)
+
+			# propagate any unexpected errors from reading the jobs
+			await scheduler
+			logger.debug(
+				'image jobs so far: %s skipped the image workers, %s used them',
+				self.image_pool.skipped, self.image_pool.processed)
+		finally:
+			scheduler.cancel()
+			for task in pending:
+				task.cancel()
+			await asyncio.gather(scheduler, *pending, return_exceptions=True)
+			await progress.finish()
+
+	async def prepare_emote(self, job):
+		"""Download and resize the image for an EmoteJob.
+
+		Returns (job, image data, None) on success or (job, None, a message for the user) on error.
+		"""
+		if job.error is not None:
+			return job, None, job.error
 
-			await context.send(f'{name}: {error}')
+		image_data = job.image
+		try:
+			if job.url is not None:
+				image_data = await self.fetch_safe(job.url)
+				if type(image_data) is str:  # error case
+					return job, None, f'{job.name}: {image_data}'
+
+			image_data = await utils.image.resize_in_subprocess(image_data)
+		except errors.EmoteManagerError as exc:
+			return job, None, discord.utils.escape_mentions(f'{job.name}: {exc}')
+		except Exception:
+			# such as an image worker dying. That shouldn't take the rest of the batch down with it.
+			logger.exception('preparing emote %s failed', job.name)
+			return job, None, discord.utils.escape_mentions(f'{job.name}: An unexpected error occurred.')
+
+		return job, image_data, None
 
 	async def add_safe(self, context, name, url, author_id, *, reason=None):
 		"""Try to add an emote. Returns a string that should be sent to the user."""
 		try:
-			image_data = await self.fetch_safe(url)
+			async with self.admitted(context, 'download'):
+				image_data = await self.fetch_safe(url)
 		except errors.InvalidFileError:
 			raise errors.InvalidImageError
 
@@ -397,69 +683,132 @@ class Emotes(commands.Cog):
 			return image_data
 		return await self.add_safe_bytes(context, name, author_id, image_data, reason=reason)
 
-	async def fetch_safe(self, url, valid_mimetypes=None, *, validate_headers=False):
-		"""Try to fetch a URL. On error return a string that should be sent to the user."""
+	async def fetch_safe(self, url, valid_mimetypes=None, *, validate_headers=True, file=None):
+		"""Try to fetch a URL. On error return a string that should be sent to the user.
+
+		Images of custom emotes are served from the emote image cache if possible.
+		"""
+		emote = utils.emote.parse_url(url) if self.image_cache is not None and file is None else None
+		if emote is not None:
+			data = await self.image_cache.get(*emote)
+			if data is not None:
+				return data
+
 		try:
-			return await self.fetch(url, valid_mimetypes=valid_mimetypes, validate_headers=validate_headers)
+			data = await self.fetch(url, valid_mimetypes=valid_mimetypes, validate_headers=validate_headers, file=file)
 		except asyncio.TimeoutError:
 			return 'Error: retrieving the image took too long.'
 		except ValueError:
 			return 'Error: Invalid URL.'
+		except errors.FileTooBigError as exc:
+			return f'Error: that file is too big. The limit is {humanize.naturalsize(exc.limit)}.'
 		except aiohttp.ClientResponseError as exc:
 			raise errors.HTTPException(exc.status)
 
-	async def add_safe_bytes(self, context, name, author_id, image_data: bytes, *, reason=None):
+		if emote is not None:
+			await self.image_cache.put(*emote, data)
+		return data
+
+	async def add_safe_bytes(
+		self, context, name, author_id, image_data: bytes, *, reason=None, counts=None, resized=False,
+	):
 		"""Try to add an emote from bytes. On error, return a string that should be sent to the user.
 
 		If the image is static and there are not enough free static slots, convert the image to a gif instead.
+
+		counts: a Counter of whether each emote in the guild is animated.
+		Callers adding several emotes in a row can pass the same one each time, and it will be kept up to date.
+		resized: whether image_data has already been through resize_in_subprocess.
 		"""
-		counts = collections.Counter(map(operator.attrgetter('animated'), context.guild.emojis))
+		if counts is None:
+			counts = self.emote_index(context.guild).counts.copy()
 		# >= rather than == because there are sneaky ways to exceed the limit
 		if counts[False] >= context.guild.emoji_limit and counts[True] >= context.guild.emoji_limit:
 			# we raise instead of returning a string in order to abort commands that run this function in a loop
 			raise commands.UserInputError('This server is out of emote slots.')
 
 		static = utils.image.mime_type_for_image(image_data) != 'image/gif'
-		converted = False
-		if static and counts[False] >= context.guild.emoji_limit:
-			image_data = await utils.image.convert_to_gif_in_subprocess(image_data)
-			converted = True
+		converted = static and counts[False] >= context.guild.emoji_limit
+		if converted or not resized:
+			# only the image work needs an admission, not the upload
+			async with self.admitted(context, 'image'):
+				if converted:
+					image_data = await utils.image.convert_to_gif_in_subprocess(image_data)
+				image_data = await utils.image.resize_in_subprocess(image_data)
 
 		try:
-			emote = await self.create_emote_from_bytes(context.guild, name, author_id, image_data, reason=reason)
+			emote = await self.create_emote_from_bytes(
+				context.guild, name, author_id, image_data, reason=reason, resized=True)
 		except discord.InvalidArgument:
 			return discord.utils.escape_mentions(f'{name}: The file supplied was not a valid GIF, PNG, JPEG, or WEBP file.')
 		except discord.HTTPException as ex:
 			return discord.utils.escape_mentions(
 				f'{name}: An error occurred while creating the the emote:\n'
 				+ utils.format_http_exception(ex))
+
+		counts[emote.animated] += 1
 		s = f'Emote {emote} successfully created'
 		return s + ' as a GIF.' if converted else s + '.'
 
-	async def fetch(self, url, valid_mimetypes=IMAGE_MIMETYPES, *, validate_headers=True):
+	async def fetch(self, url, valid_mimetypes=IMAGE_MIMETYPES, *, validate_headers=True, file=None):
+		"""Download a URL with a single GET request, giving up as soon as it's clear the response is unacceptable.
+
+		If validate_headers is True, the Content-Type must be one of valid_mimetypes.
+		Images are sniffed from their first bytes, and every download is subject to a per-kind size limit.
+		If file is given, the response is written to it and file is returned. Otherwise the response is returned as bytes.
+		"""
 		valid_mimetypes = valid_mimetypes or self.IMAGE_MIMETYPES
-		def validate_headers(response):
+		is_image = valid_mimetypes <= self.IMAGE_MIMETYPES
+		if is_image:
+			size_limit = self.bot.config.get('http_image_size_limit', 20 * 2**20)
+		else:
+			size_limit = self.bot.config.get('http_archive_size_limit', 100 * 2**20)
+
+		def check_headers(response):
 			response.raise_for_status()
-			# some dumb servers also send '; charset=UTF-8' which we should ignore
-			mimetype, options = cgi.parse_header(response.headers.get('Content-Type', ''))
-			if mimetype not in valid_mimetypes:
-				raise errors.InvalidFileError
+			if validate_headers:
+				# some dumb servers also send '; charset=UTF-8' which we should ignore
+				mimetype, options = cgi.parse_header(response.headers.get('Content-Type', ''))
+				if mimetype not in valid_mimetypes:
+					raise errors.InvalidFileError
+			if response.content_length is not None and response.content_length > size_limit:
+				raise errors.FileTooBigError(response.content_length, size_limit)
 
-		async def validate(request):
-			try:
-				async with request as response:
-					validate_headers(response)
-					return await response.read()
-			except aiohttp.ClientResponseError:
-				raise
-			except aiohttp.ClientError as exc:
-				raise errors.EmoteManagerError(f'An error occurred while retrieving the file: {exc}')
-
-		if validate_headers: await validate(self.http.head(url, timeout=self.bot.config.get('http_head_timeout', 10)))
-		return await validate(self.http.get(url))
-
-	async def create_emote_from_bytes(self, guild, name, author_id, image_data: bytes, *, reason=None):
-		image_data = await utils.image.resize_in_subprocess(image_data)
+		try:
+			response = await asyncio.wait_for(
+				self.http.get(url),
+				timeout=self.bot.config.get('http_head_timeout', 10))
+			async with response:
+				check_headers(response)
+
+				buf = io.BytesIO() if file is None else file
+				head = b''
+				async for chunk in response.content.iter_chunked(self.FETCH_CHUNK_SIZE):
+					buf.write(chunk)
+					if buf.tell() > size_limit:
+						response.close()
+						raise errors.FileTooBigError(buf.tell(), size_limit)
+					# make sure we have enough bytes to tell all the image types apart
+					if is_image and len(head) < self.SNIFF_BYTES:
+						head += chunk[:self.SNIFF_BYTES - len(head)]
+						if len(head) == self.SNIFF_BYTES:
+							utils.image.mime_type_for_image(head, partial=True)
+
+				if file is not None:
+					return file
+				data = buf.getvalue()
+		except aiohttp.ClientResponseError:
+			raise
+		except aiohttp.ClientError as exc:
+			raise errors.EmoteManagerError(f'An error occurred while retrieving the file: {exc}')
+
+		if is_image and len(head) < self.SNIFF_BYTES:
+			utils.image.mime_type_for_image(data)
+		return data
+
+	async def create_emote_from_bytes(self, guild, name, author_id, image_data: bytes, *, reason=None, resized=False):
+		if not resized:
+			image_data = await utils.image.resize_in_subprocess(image_data)
 		if reason is None:
 			reason = f'Created by {utils.format_user(self.bot, author_id)}'
 		return await guild.create_custom_emoji(name=name, image=image_data, reason=reason)
@@ -474,11 +823,27 @@ class Emotes(commands.Cog):
 			emote = await self.parse_emote(context, emote)
 			await emote.delete(reason=f'Removed by {utils.format_user(self.bot, context.author.id)}')
 			await context.send(fr'Emote \:{emote.name}: successfully removed.')
-		else:
-			for emote in (emote,) + emotes:
-				await context.invoke(self.remove, emote)
-			with contextlib.suppress(discord.HTTPException):
-				await context.message.add_reaction(utils.SUCCESS_EMOJIS[True])
+			return
+
+		progress = utils.progress.ProgressMessage(context)
+		try:
+			for name in (emote,) + emotes:
+				try:
+					emote = await self.parse_emote(context, name)
+					await emote.delete(reason=f'Removed by {utils.format_user(self.bot, context.author.id)}')
+				except (errors.EmoteManagerError, commands.UserInputError) as exc:
+					progress.add(discord.utils.escape_mentions(str(exc)))
+				except discord.HTTPException as ex:
+					progress.add(discord.utils.escape_mentions(
+						f'{name}: An error occurred while removing the emote:\n'
+						+ utils.format_http_exception(ex)))
+				else:
+					progress.add(fr'Emote \:{emote.name}: successfully removed.')
+		finally:
+			await progress.finish()
+
+		with contextlib.suppress(discord.HTTPException):
+			await context.message.add_reaction(utils.SUCCESS_EMOJIS[True])
 
 	@commands.command(aliases=('mv',))
 	async def rename(self, context, old, new_name):
@@ -511,33 +876,30 @@ class Emotes(commands.Cog):
 		If "static" is provided, only show static emotes.
 		If “all” is provided, show all emotes.
 		"""
-		emotes = sorted(
-			filter(image_type, context.guild.emojis),
-			key=lambda e: e.name.lower())
+		emotes = self.emote_index(context.guild).sorted
+		if image_type is not all_emote_types:
+			emotes = list(filter(image_type, emotes))
 
-		processed = []
-		for emote in emotes:
-			raw = str(emote).replace(':', r'\:')
-			processed.append(f'{emote} {raw}')
-
-		paginator = ListPaginator(context, processed)
+		paginator = self.ListPaginator(context, emotes, formatter=self.format_list_entry)
 		self.paginators.add(paginator)
 		await paginator.begin()
 
+	@staticmethod
+	def format_list_entry(emote):
+		"""Show an emote and its raw form."""
+		raw = str(emote).replace(':', r'\:')
+		return f'{emote} {raw}'
+
 	@public
 	@commands.command(aliases=['status'])
 	async def stats(self, context):
 		"""The current number of animated and static emotes relative to the limits."""
 		emote_limit = context.guild.emoji_limit
 
-		static_emotes = animated_emotes = total_emotes = 0
-		for emote in context.guild.emojis:
-			if emote.animated:
-				animated_emotes += 1
-			else:
-				static_emotes += 1
-
-			total_emotes += 1
+		counts = self.emote_index(context.guild).counts
+		static_emotes = counts[False]
+		animated_emotes = counts[True]
+		total_emotes = static_emotes + animated_emotes
 
 		percent_static = round((static_emotes / emote_limit) * 100, 2)
 		percent_animated = round((animated_emotes / emote_limit) * 100, 2)
@@ -568,41 +930,62 @@ class Emotes(commands.Cog):
 			await context.send("You must specify an emote.")
 
 	async def show_emote(self, context, emote):
-		try:
-			emoteFull = await context.guild.fetch_emoji(emote.id)
-		except:
+		metadata = None
+		if context.guild is not None:
+			try:
+				metadata = await self.emote_metadata.get(
+					(context.guild.id, emote.id),
+					functools.partial(self.fetch_emote_metadata, context.guild, emote.id))
+			except discord.Forbidden:
+				pass
+
+		if metadata is None:
 			await context.send(f':{emote.name}: {emote.url}')
-		else:
-			# Sending the message as an embed
-			embed = discord.Embed.from_dict({
-				"title": "Emote",
-				"type": "rich",
-				"color": 16763981,
-				"image": {
-					"url": f"{emoteFull.url}"
-				},
-				"fields": [{
-					"name": "Name",
-					"value": f":{emoteFull.name}:"
-				}, {
-					"name": "URL",
-					"value": f"{emoteFull.url}"
-				}, {
-					"name": "Added by",
-					"value": f"{emoteFull.user.name}#{emoteFull.user.discriminator} {emoteFull.user.mention}"
-				}],
-				"footer": {
-					"text": "Emote added on:"
-				},
-				"timestamp": f"{emoteFull.created_at}"
+			return
+
+		fields = [{
+			"name": "Name",
+			"value": f":{emote.name}:"
+		}, {
+			"name": "URL",
+			"value": f"{emote.url}"
+		}]
+		# the API only tells us who added the emote if we have permission to manage emotes
+		if metadata.user is not None:
+			fields.append({
+				"name": "Added by",
+				"value": f"{metadata.user.name}#{metadata.user.discriminator} {metadata.user.mention}"
 			})
-			await context.send(embed=embed)
+
+		# Sending the message as an embed
+		embed = discord.Embed.from_dict({
+			"title": "Emote",
+			"type": "rich",
+			"color": 16763981,
+			"image": {
+				"url": f"{emote.url}"
+			},
+			"fields": fields,
+			"footer": {
+				"text": "Emote added on:"
+			},
+			"timestamp": f"{metadata.created_at}"
+		})
+		await context.send(embed=embed)
+
+	@staticmethod
+	async def fetch_emote_metadata(guild, id):
+		try:
+			emote = await guild.fetch_emoji(id)
+		except discord.NotFound:
+			# the emote is from another server. Remember that too, so that we don't keep asking.
+			return None
+		return EmoteMetadata(user=emote.user, created_at=emote.created_at)
 
 	async def parse_emote(self, context, name_or_emote):
-		match = utils.emote.RE_CUSTOM_EMOTE.match(name_or_emote)
-		if match:
-			id = int(match.group('id'))
-			emote = discord.utils.get(context.guild.emojis, id=id)
+		parsed = utils.emote.parse_custom_emote(name_or_emote)
+		if parsed:
+			emote = self.emote_index(context.guild).by_id.get(parsed.id)
 			if emote:
 				return emote
 		name = name_or_emote
@@ -610,7 +993,7 @@ class Emotes(commands.Cog):
 
 	async def disambiguate(self, context, name):
 		name = name.strip(':')  # in case the user tries :foo: and foo is animated
-		candidates = [e for e in context.guild.emojis if e.name.lower() == name.lower() and e.require_colons]
+		candidates = [e for e in self.emote_index(context.guild).find(name) if e.require_colons]
 		if not candidates:
 			raise errors.EmoteNotFoundError(name)
 
@@ -650,91 +1033,132 @@ class Emotes(commands.Cog):
 		If "reaction" is provided, then only reactions to the linked message will be returned.
 		If "all" is provided, then both will be returned. (default)
 		"""
-		url_match = re.findall("^https://[a-z]*.?discord.com/channels/([0-9]{18})/([0-9]{18})/([0-9]{18})$", url)
-		if url_match:
-			if (not context.guild) or (url_match[0][0] == str(context.guild.id)):
-				try:
-					url_channel = self.bot.get_channel(int(url_match[0][1]))
-					url_message = await url_channel.fetch_message(int(url_match[0][2]))
-				except:
-					await context.send(f'{utils.SUCCESS_EMOJIS[False]} I cannot access this message.')
+		link = utils.emote.parse_message_link(url)
+		if link is None:
+			await context.send(f"{utils.SUCCESS_EMOJIS[False]} You did not specify a valid URL. You can get a message's URL by right clicking on it and selecting 'Copy Message Link'.")
+			return
+
+		if context.guild and link.guild_id != context.guild.id:
+			await context.send(f'{utils.SUCCESS_EMOJIS[False]} You are only allowed to specify a message from within this server.')
+			return
+
+		try:
+			url_channel = self.bot.get_channel(link.channel_id)
+			url_message = await url_channel.fetch_message(link.message_id)
+		except (AttributeError, discord.HTTPException):  # AttributeError: we can't see the channel
+			await context.send(f'{utils.SUCCESS_EMOJIS[False]} I cannot access this message.')
+			return
+
+		results = []
+		if (look_for == "message") or (look_for == "all"):
+			for emote in utils.emote.find_custom_emotes(url_message.content):
+				results.append(f":{emote.name}: {emote.url}")
+		if (look_for == "reaction") or (look_for == "all"):
+			for reaction in url_message.reactions:
+				if reaction.custom_emoji:
+					results.append(f"(reaction) :{reaction.emoji.name}: {reaction.emoji.url}")
 				else:
-					results = []
-					if (look_for == "message") or (look_for == "all"):
-						em_match = re.findall("<(a)?:([A-z0-9-_]{2,32}):([0-9]{18})>", url_message.content)
-						if em_match:
-							emotes_in = []
-							for i in em_match:
-								# Removing duplicate list items
-								if i not in emotes_in:
-									emotes_in.append(i)
-							for emote in emotes_in:
-								if emote[0]:
-									results.append(f":{emote[1]}: https://cdn.discordapp.com/emojis/{emote[2]}.gif")
-								else:
-									results.append(f":{emote[1]}:\nhttps://cdn.discordapp.com/emojis/{emote[2]}.png")
-					if (look_for == "reaction") or (look_for == "all"):
-						if url_message.reactions:
-							for reaction in url_message.reactions:
-								if reaction.custom_emoji:
-									results.append(f"(reaction) :{reaction.emoji.name}: {reaction.emoji.url}")
-								else:
-									results.append(f"(reaction) {reaction.emoji} (Unicode emoji)")
-					if results == []:
-						await context.send("I did not see any emotes in this message.")
-					else:
-						paginator = ListPaginator(context, results)
-						self.paginators.add(paginator)
-						await paginator.begin()
-			else:
-				await context.send(f'{utils.SUCCESS_EMOJIS[False]} You are only allowed to specify a message from within this server.')
+					results.append(f"(reaction) {reaction.emoji} (Unicode emoji)")
+
+		if not results:
+			await context.send("I did not see any emotes in this message.")
 		else:
-			await context.send(f"{utils.SUCCESS_EMOJIS[False]} You did not specify a valid URL. You can get a message's URL by right clicking on it and selecting 'Copy Message Link'.")
+			paginator = self.ListPaginator(context, results)
+			self.paginators.add(paginator)
+			await paginator.begin()
 
 	@public
 	@commands.command(aliases=['html'])
 	@commands.bot_has_permissions(attach_files=True)
 	@commands.cooldown(1, 20, type=commands.BucketType.guild)
-	async def archive(self, ctx):
+	async def archive(self, ctx, mode=None):
 		"""Outputs an HTML file containing all of the server's emotes.
-		At this time, this command does not have any parameters."""
+
+		By default, the file links to the emote images on Discord, so it will break if the emotes are deleted.
+		If “embed” is provided, the images are stored inside the file instead,
+		which may be split into several files to fit the upload limit.
+		"""
 
 		if not(ctx.guild) or ctx.author.bot:
 			return
 
-		print("Recieved archive request")
+		if mode not in {None, 'embed'}:
+			raise commands.BadArgument('The only option for this command is “embed”.')
 
-		emojis = ctx.guild.emojis
-		emoteNames = []
-		emoteUrls = []
-		emoteHtml = []
+		logger.debug('received archive request for guild %s', ctx.guild.id)
 
-		for emoji in emojis:
-			emoteNames.append(emoji.name)
-			emoteUrls.append(emoji.url)
+		job_classes = ('download', 'archive') if mode == 'embed' else ('archive',)
+		async with self.admitted(ctx, *job_classes):
+			progress = utils.progress.ProgressMessage(ctx)
+			try:
+				async with ctx.typing():
+					async for html_file in self.html_archive(ctx, ctx.guild.emojis, progress, embed=mode == 'embed'):
+						await ctx.send(content=ctx.author.mention, file=html_file)
+			finally:
+				await progress.finish()
 
-		i = 0
-		while i < len(emoteNames):
-			emoteHtml.append('\t<img title=":%s:" alt=":%s:" src="%s">' % (emoteNames[i], emoteNames[i], emoteUrls[i]))
-			i += 1
+	async def html_archive(self, context, emotes, progress, *, embed=False):
+		"""Yield HTML files showing the given emotes, rendered in memory one emote at a time.
 
-		body = "\n".join(emoteHtml)
-		serverName = ctx.guild.name
+		If embed is True, the images are downloaded and stored in the files as data URLs,
+		and a new file is started whenever the next emote would exceed the guild's file size limit.
+		"""
+		filesize_limit = context.guild.filesize_limit
 		localtime = time.localtime()
-		currentDate = time.strftime("%B %d, %Y", localtime)
-		currentTime = time.strftime("%H:%M %Z", localtime)
+		date = time.strftime("%B %d, %Y", localtime)
+		time_ = time.strftime("%H:%M %Z", localtime)
+		footer = HTML_ARCHIVE_FOOTER.encode('utf-8')
+		count = 1
+		out = None
+
+		def header():
+			return (HTML_ARCHIVE_HEADER % dict(
+				server=html.escape(context.guild.name),
+				part=f' (part {count})' if count > 1 else '',
+				date=date,
+				time=time_,
+			)).encode('utf-8')
+
+		def finish(*, last):
+			out.write(footer)
+			out.seek(0)
+			# without embed, a new file is only started if the image links don't fit in one
+			suffix = f'-{count}' if embed or count > 1 or not last else ''
+			return discord.File(out, f'emote-archive-{context.guild.id}{suffix}.html')
+
+		if embed:
+			images = (
+				(emote, await self.bot.loop.run_in_executor(None, utils.image.image_to_base64_url, data))
+				async for emote, _, data
+				in self.download_emotes(((emote, None) for emote in emotes), progress))
+		else:
+			images = utils.as_async_iterable((emote, str(emote.url)) for emote in emotes)
 
-		fullHtml = '<!DOCTYPE html>\n<html>\n<head>\n\t<!-- Generated by Emote Manager https://github.com/saucylegs/EmoteManager -->\n\t<meta charset="UTF-8">\n\t<meta name="viewport" content="width=device-width, initial-scale=1.0">\n\t<meta name="robots" content="noindex">\n\t<style>\n\t\tbody {\n\t\t\tfont-family: system-ui, -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Ubuntu, "Open Sans", sans-serif;\n\t\t\tfont-size: 1.25rem;\n\t\t\tmargin: 8px;\n\t\t\tbackground-color: #2f3136;\n\t\t\tcolor: #ffffff;\n\t\t}\n\t\th1, p {\n\t\t\tmargin: 0.5rem 0;\n\t\t}\n\t\timg {\n\t\t\tmax-width: 64px;\n\t\t\tmax-height: 64px;\n\t\t\tmargin: 5px 2px;\n\t\t\tvertical-align: middle;\n\t\t}\n\t</style>\n\t<title>%s Emote Archive (%s)</title>\n\t<meta name="og:title" content="%s Emote Archive (%s)">\n</head>\n<body>\n\t<h1>%s Emote Archive</h1>\n\t<p>Archived on %s at %s</p>\n\t<p>On some browsers, you can hover over an emote to see its name.</p>\n%s\n</body>\n</html>' % (serverName, currentDate, serverName, currentDate, serverName, currentDate, currentTime, body)
+		async for emote, src in images:
+			name = html.escape(emote.name)
+			img = f'\n\t<img title=":{name}:" alt=":{name}:" src="{src}">'.encode('utf-8')
 
-		filepath = "./generated/emote-archive-" + str(time.time_ns()) + ".html"
-		f = open(filepath, "x")
-		f.write(fullHtml)
-		f.close()
+			if out is not None and out.tell() + len(img) + len(footer) >= filesize_limit:
+				yield finish(last=False)
+				count += 1
+				out = None
 
-		await ctx.send(content=ctx.author.mention, file=discord.File(filepath))
+			if out is None:
+				out = io.BytesIO()
+				out.write(header())
+				if out.tell() + len(img) + len(footer) >= filesize_limit:
+					progress.add(f'{emote} could not be added because it alone would exceed the file size limit.')
+					out = None
+					continue
 
-		os.remove(filepath)
-		
+			out.write(img)
+
+		if out is None and count == 1:
+			# no emotes, but an empty archive is still an archive
+			out = io.BytesIO()
+			out.write(header())
+		if out is not None:
+			yield finish(last=True)
 
 def setup(bot):
 	bot.add_cog(Emotes(bot))
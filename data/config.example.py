@@ -25,12 +25,66 @@
 
 	'copyright_license_file': 'data/short-license.txt',
 
+	# load the debugging extensions (jishaku, bot_bin.debug) only once the bot is ready, to speed up startup.
+	# run `python -m utils.importtime` to see what else startup spends its time importing.
+	'defer_extensions': True,
+
 	'socks5_proxy_url': None,  # required for connecting to the EC API over a Tor onion service
 	'use_socks5_for_all_connections': False,  # whether to use socks5 for all HTTP operations (other than discord.py)
 	'user_agent': 'EmoteManagerBot (https://github.com/iomintz/emote-manager-bot)',
 	'ec_api_base_url': None,  # set to None to use the default of https://ec.emote.bot/api/v0
-	'http_head_timeout': 10,  # timeout for the initial HEAD request before retrieving any images (up this if using Tor)
+	'ec_cache_ttl': 600,  # seconds to remember Emote Collector emotes, including ones that weren't found
+	'ec_cache_max_entries': 1000,
+	'ec_lookup_concurrency': 4,  # how many emotes add-from-ec may look up at once
+	'http_head_timeout': 10,  # timeout for receiving the response headers before retrieving any file (up this if using Tor)
 	'http_read_timeout': 60,  # timeout for retrieving an image
+	'http_connection_limit': 100,  # maximum number of open connections, in total
+	'http_connection_limit_per_host': 10,  # and to any one host, such as cdn.discordapp.com
+	'http_keepalive_timeout': 30,  # seconds to keep idle connections open for reuse
+	'http_dns_cache_ttl': 300,  # seconds to cache DNS lookups
+	'http_image_size_limit': 20 * 2**20,  # downloads of images are aborted once they exceed this many bytes
+	'http_archive_size_limit': 100 * 2**20,  # likewise for zip and tar archives passed to the import command
+	'archive_spool_size': 8 * 2**20,  # archives bigger than this are downloaded to a temporary file instead of memory
+	'export_concurrency': 8,  # how many emote images the export command may download at once
+	# how many images import, add-these and add-from-ec may download and resize at once, ahead of uploading them
+	'upload_prepare_concurrency': 4,
+	# how many images they may have prepared but not uploaded yet. They're prepared in batches of up to this many,
+	# and only hold their admission (see admission_budgets) while preparing a batch, not while uploading it.
+	'upload_prepare_ahead': 20,
+
+	# where to cache the images of custom emotes downloaded from Discord. Set to None to disable the cache.
+	'emote_cache_path': 'data/emote-cache',
+	'emote_cache_max_bytes': 512 * 2**20,  # the least recently used images are removed past this size
+	'emote_cache_memory_bytes': 32 * 2**20,  # how much of the cache to also keep in memory
+
+	'emote_metadata_ttl': 3600,  # seconds to remember who added an emote, for the show command
+	'emote_metadata_max_entries': 10_000,
+
+	# how many heavy jobs may run at once, across all servers, by what they need:
+	# image processing, downloads, and archives held in memory. Adding emotes is admitted in phases:
+	# downloading and resizing count, but uploading doesn't. Each server may run admission_per_guild at once,
+	# and servers take turns when they have to wait.
+	'admission_budgets': {'image': 2, 'download': 4, 'archive': 2},
+	'admission_per_guild': 1,
+
+	'image_workers': 2,  # number of long-lived processes used to resize and convert images
+	'image_timeout': 60,  # seconds an image may take to resize or convert before its worker is killed
+	'image_worker_max_jobs': 100,  # restart each image worker after this many images to contain memory leaks
+	# images which need more than this to process are rejected. Set any of them to None to remove that limit.
+	'image_limits': {
+		'address_space': 2 * 2**30,  # bytes of virtual memory each image worker may use
+		'cpu_time': 60,  # seconds of CPU time each image may take (unlike image_timeout, this excludes waiting)
+		# ImageMagick's own limits
+		'memory': 256 * 2**20,  # bytes of pixel cache to keep in memory
+		'map': 512 * 2**20,  # bytes of pixel cache to memory map, past the memory limit
+		'area': 128 * 10**6,  # pixels in a single frame
+		'width': 16384,
+		'height': 16384,
+	},
+
+	# how to navigate the pages of the list and identify commands:
+	# 'reactions', or 'buttons' to use message buttons, which need fewer requests
+	'paginator': 'reactions',
 
 	# emotes that the bot may use to respond to you
 	# If not provided, the bot will use '❌', '✅' instead.
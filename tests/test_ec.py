@@ -0,0 +1,71 @@
+import asyncio
+import types
+
+import aioec
+import pytest
+
+from utils.ec import CachedECClient
+
+class StubECClient:
+	"""answers lookups from a dict, counting them, like the Emote Collector API would"""
+
+	def __init__(self, emotes):
+		self.emotes = emotes
+		self.lookups = []
+
+	async def emote(self, name):
+		self.lookups.append(name)
+		await asyncio.sleep(0)
+		try:
+			return self.emotes[name]
+		except KeyError:
+			raise aioec.NotFound(types.SimpleNamespace(status=404, reason='Not Found'), 'Emote not found') from None
+
+def test_hit():
+	async def main():
+		stub = StubECClient({'Think': 'think emote'})
+		client = CachedECClient(stub, ttl=60)
+		assert await client.emote('Think') == 'think emote'
+		assert await client.emote('Think') == 'think emote'
+		return stub.lookups
+
+	assert asyncio.run(main()) == ['Think']
+
+def test_miss_is_cached_and_raises_a_new_exception_each_time():
+	async def main():
+		stub = StubECClient({})
+		client = CachedECClient(stub, ttl=60)
+		raised = []
+		for _ in range(3):
+			with pytest.raises(aioec.NotFound) as exc_info:
+				await client.emote('Nope')
+			raised.append(exc_info.value)
+		return stub.lookups, raised
+
+	lookups, raised = asyncio.run(main())
+	assert lookups == ['Nope']
+	assert len({id(exception) for exception in raised}) == 3
+	assert all(exception.status == 404 for exception in raised)
+
+def test_ttl_expiry():
+	async def main():
+		stub = StubECClient({'Think': 'think emote'})
+		client = CachedECClient(stub, ttl=0.05)
+		await client.emote('Think')
+		await asyncio.sleep(0.1)
+		await client.emote('Think')
+		return stub.lookups
+
+	assert asyncio.run(main()) == ['Think', 'Think']
+
+def test_emotes_coalesces_lookups():
+	async def main():
+		stub = StubECClient({'Think': 'think emote'})
+		client = CachedECClient(stub, ttl=60)
+		results = await client.emotes(['Think', 'Nope', 'Think'])
+		return stub.lookups, results
+
+	lookups, results = asyncio.run(main())
+	assert sorted(lookups) == ['Nope', 'Think']
+	assert results[0] == results[2] == 'think emote'
+	assert isinstance(results[1], aioec.NotFound)
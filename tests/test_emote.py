@@ -0,0 +1,127 @@
+import asyncio
+import collections
+import contextlib
+import functools
+import types
+
+import pytest
+from discord.ext import commands
+
+import utils.image
+from cogs.emote import EmoteJob, Emotes
+from utils.admission import AdmissionController
+
+class StubMessage:
+	def __init__(self, content):
+		self.content = content
+
+	async def edit(self, *, content):
+		self.content = content
+
+	async def delete(self):
+		self.content = None
+
+class StubContext:
+	def __init__(self):
+		self.guild = types.SimpleNamespace(id=1, emoji_limit=50)
+		self.author = types.SimpleNamespace(id=1)
+		self.messages = []
+
+	@contextlib.asynccontextmanager
+	async def typing(self):
+		yield
+
+	async def send(self, content=None, **kwargs):
+		message = StubMessage(content)
+		self.messages.append(message)
+		return message
+
+def stub_cog(add_safe_bytes, *, ahead=4):
+	cog = types.SimpleNamespace(
+		bot=types.SimpleNamespace(
+			config={'upload_prepare_concurrency': 2, 'upload_prepare_ahead': ahead},
+			loop=asyncio.get_running_loop()),
+		emote_index=lambda guild: types.SimpleNamespace(counts=collections.Counter()),
+		image_pool=types.SimpleNamespace(skipped=0, processed=0),
+		admission=AdmissionController({'image': 1, 'download': 1, 'archive': 1}),
+		add_safe_bytes=add_safe_bytes)
+	cog.prepare_emote = functools.partial(Emotes.prepare_emote, cog)
+	cog.admitted = functools.partial(Emotes.admitted, cog)
+	return cog
+
+async def resize(image_data):
+	if image_data == b'crash':
+		raise RuntimeError('image worker died. Return code: -11')
+	if image_data == b'slow':
+		await asyncio.sleep(3600)
+	return image_data
+
+def test_add_many_reports_unexpected_errors_per_job(monkeypatch):
+	monkeypatch.setattr(utils.image, 'resize_in_subprocess', resize)
+
+	async def add_safe_bytes(context, name, author_id, image_data, **kwargs):
+		return f'{name} added'
+
+	async def main():
+		context = StubContext()
+		jobs = [EmoteJob('a', image=b'a'), EmoteJob('b', image=b'crash'), EmoteJob('c', image=b'c')]
+		await Emotes.add_many(stub_cog(add_safe_bytes), context, jobs)
+		return context.messages[-1].content
+
+	assert asyncio.run(main()).splitlines() == ['a added', 'b: An unexpected error occurred.', 'c added']
+
+def test_add_many_cancels_pending_jobs_when_aborted(monkeypatch):
+	monkeypatch.setattr(utils.image, 'resize_in_subprocess', resize)
+	started = []
+
+	async def add_safe_bytes(context, name, author_id, image_data, **kwargs):
+		raise commands.UserInputError('This server is out of emote slots.')
+
+	async def main():
+		def jobs():
+			for name in 'abcd':
+				started.append(name)
+				yield EmoteJob(name, image=b'slow' if name != 'a' else b'a')
+
+		with pytest.raises(commands.UserInputError):
+			await Emotes.add_many(stub_cog(add_safe_bytes), StubContext(), jobs())
+		return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+	assert asyncio.run(main()) == []
+	assert started
+
+def test_add_many_releases_admission_while_uploading(monkeypatch):
+	monkeypatch.setattr(utils.image, 'resize_in_subprocess', resize)
+
+	async def main():
+		async def admit_other_guild():
+			async with cog.admission.admit(2, ['download', 'image']):
+				pass
+
+		async def add_safe_bytes(context, name, author_id, image_data, **kwargs):
+			# while the first upload is held up by the rate limit, another guild gets a turn
+			if name == 'a':
+				await asyncio.wait_for(admit_other_guild(), 1)
+			return f'{name} added'
+
+		cog = stub_cog(add_safe_bytes, ahead=2)
+		context = StubContext()
+		await Emotes.add_many(cog, context, [EmoteJob(name, image=name.encode()) for name in 'abcde'])
+		return cog.admission.in_use, context.messages[-1].content
+
+	in_use, results = asyncio.run(main())
+	assert not +in_use
+	assert results.splitlines() == [f'{name} added' for name in 'abcde']
+
+def test_html_archive_names_each_part(monkeypatch):
+	async def main():
+		context = StubContext()
+		context.guild.name = 'test'
+		context.guild.filesize_limit = 2000
+		emotes = [types.SimpleNamespace(name=f'e{i}', url=f'https://cdn.example/{i:0100}.png') for i in range(20)]
+		progress = types.SimpleNamespace(add=lambda message: None)
+		return [file.filename async for file in Emotes.html_archive(stub_cog(None), context, emotes, progress)]
+
+	filenames = asyncio.run(main())
+	assert len(filenames) > 1
+	assert len(set(filenames)) == len(filenames)
@@ -0,0 +1,55 @@
+import asyncio
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import utils.ec
+import utils.http
+
+async def serve():
+	async def hello(request):
+		return web.Response(text='hello')
+
+	async def emote(request):
+		return web.json_response({'name': request.match_info['name']})
+
+	app = web.Application()
+	app.router.add_get('/hello', hello)
+	app.router.add_get('/emote/{name}', emote)
+	server = TestServer(app)
+	await server.start_server()
+	return server
+
+def test_sessions_do_not_close_shared_connector():
+	async def main():
+		server = await serve()
+		pool = utils.http.ConnectionPool()
+		try:
+			session = aiohttp.ClientSession(
+				connector=pool.connector, connector_owner=False, trace_configs=[pool.trace_config])
+			client = utils.ec.SharedConnectorClient(
+				connector=pool.proxy_connector, trace_configs=[pool.trace_config],
+				base_url=str(server.make_url('')))
+
+			async with session.get(server.make_url('/hello')) as response:
+				assert await response.text() == 'hello'
+			assert (await client.emote('Think')).name == 'Think'
+
+			await session.close()
+			await client.close()
+			assert not pool.connector.closed
+			async with aiohttp.ClientSession(connector=pool.connector, connector_owner=False) as session:
+				async with session.get(server.make_url('/hello')) as response:
+					assert response.status == 200
+
+			stats = pool.stats()
+			assert stats.requests == 2
+			assert stats.in_use == 0
+			assert stats.created + stats.reused == 2
+		finally:
+			await pool.close()
+			await server.close()
+		assert pool.connector.closed
+
+	asyncio.run(main())
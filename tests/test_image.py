@@ -0,0 +1,114 @@
+import io
+import random
+
+import pytest
+
+from bench import corpus
+from utils import errors, image
+
+try:
+	image._import_wand()
+except (ImportError, OSError):
+	has_imagemagick = False
+else:
+	has_imagemagick = image._can_shrink_animations()
+
+requires_imagemagick = pytest.mark.skipif(not has_imagemagick, reason='ImageMagick is not installed')
+
+TRUNCATED_GIF = b'GIF89a\x01\x00\x01\x00'
+
+def test_probe_truncated_gif_header():
+	with pytest.raises(errors.InvalidImageError):
+		image.probe(TRUNCATED_GIF)
+
+def test_probe_truncated_gif_header_partial():
+	info = image.probe(TRUNCATED_GIF, partial=True)
+	assert (info.mime, info.width, info.height, info.frames, info.animated) == ('image/gif', 1, 1, None, False)
+
+def test_already_fits_truncated_gif():
+	assert not image.already_fits(TRUNCATED_GIF)
+
+GIF_FRAME = b'\x2C\0\0\0\0\x01\0\x01\0\0' + b'\x02' + b'\x02\x4C\x01\0'
+THREE_FRAME_GIF = b'GIF89a\x01\x00\x01\x00\0\0\0' + GIF_FRAME * 3 + b'\x3B'
+# cut off in the middle of the last frame
+TRUNCATED_ANIMATED_GIF = THREE_FRAME_GIF[:-4]
+
+def test_probe_animated_gif():
+	info = image.probe(THREE_FRAME_GIF)
+	assert (info.width, info.height, info.frames, info.animated) == (1, 1, 3, True)
+
+def test_probe_truncated_animated_gif():
+	with pytest.raises(errors.InvalidImageError):
+		image.probe(TRUNCATED_ANIMATED_GIF)
+
+def test_probe_truncated_animated_gif_partial():
+	info = image.probe(TRUNCATED_ANIMATED_GIF, partial=True)
+	assert (info.frames, info.animated) == (None, True)
+
+# the data ends inside the IHDR chunk, before the dimensions
+TRUNCATED_PNG = b'\x89PNG\r\n\x1a\n\0\0\0\x0DIHDR\0\0'
+
+def test_probe_truncated_png_header():
+	with pytest.raises(errors.InvalidImageError):
+		image.probe(TRUNCATED_PNG)
+
+def test_probe_truncated_png_header_partial():
+	info = image.probe(TRUNCATED_PNG, partial=True)
+	assert (info.mime, info.width, info.height, info.frames, info.animated) == ('image/png', None, None, None, False)
+
+def make_animation(frames, *, size=64, noise=1.0, delay=5):
+	"""a coalesced animation of noisy frames, which compresses poorly"""
+	rng = random.Random(0)
+	animation = image.wand.image.Image()
+	for _ in range(frames):
+		with image.wand.image.Image(blob=corpus.encode_png(size, size, corpus.pixels(size, size, noise, rng))) as frame:
+			frame.delay = delay
+			animation.sequence.append(frame)
+	animation.format = 'gif'
+	return animation
+
+@requires_imagemagick
+def test_quantize_animation_quantizes_every_frame():
+	with make_animation(3) as animation:
+		image._quantize_animation(animation, 16)
+		data = animation.make_blob('gif')
+	with image.wand.image.Image(blob=data) as result:
+		assert len(result.sequence) == 3
+		for frame in result.sequence:
+			assert frame.colors <= 16
+
+@requires_imagemagick
+def test_decimate_animation_keeps_duration():
+	with make_animation(5, delay=5) as animation:
+		image._decimate_animation(animation)
+		assert [frame.delay for frame in animation.sequence] == [10, 10, 5]
+
+@requires_imagemagick
+def test_animation_candidates_skip_decimating_two_frames():
+	with make_animation(2) as animation:
+		strategies = [strategy for strategy, data in image._animation_candidates(animation)]
+	assert strategies == ['quantize']
+
+@requires_imagemagick
+def test_animation_candidates_shrink():
+	with make_animation(6) as animation:
+		original_size = len(animation.make_blob('gif'))
+		candidates = list(image._animation_candidates(animation))
+		assert len(animation.sequence) == 3
+	assert [strategy for strategy, data in candidates] == list(image.ANIMATION_STRATEGIES)
+	sizes = [len(data) for strategy, data in candidates]
+	assert sizes[0] < original_size
+	assert sizes[1] < sizes[0]
+
+@requires_imagemagick
+def test_resize_until_small_keeps_animations_animated():
+	with make_animation(24, size=256) as animation:
+		data = animation.make_blob('gif')
+	assert len(data) > image.MAX_EMOTE_SIZE
+
+	image_data = io.BytesIO(data)
+	assert image.resize_until_small(image_data)
+	resized = image_data.getvalue()
+	assert len(resized) <= image.MAX_EMOTE_SIZE
+	info = image.probe(resized)
+	assert info.mime == 'image/gif' and info.animated
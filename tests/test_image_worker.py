@@ -0,0 +1,129 @@
+import asyncio
+import json
+import subprocess
+import sys
+import time
+
+import pytest
+
+from utils import errors, image
+
+# speaks the worker protocol, but takes orders from the payload instead of processing images
+STUB_WORKER = r'''
+import os, resource, signal, struct, sys, time
+resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+header = struct.Struct('!BI')
+stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+while True:
+	data = stdin.read(header.size)
+	if len(data) < header.size:
+		sys.exit(0)
+	opcode, length = header.unpack(data)
+	payload = stdin.read(length)
+	if payload == b'xcpu':
+		os.kill(os.getpid(), signal.SIGXCPU)
+	elif payload == b'kill':
+		os.kill(os.getpid(), signal.SIGKILL)
+	elif payload == b'hang':
+		time.sleep(60)
+	elif payload == b'close':
+		# stop talking without exiting
+		os.close(1)
+		time.sleep(60)
+	elif payload == b'truncate':
+		# promise more than we send, then die
+		stdout.write(header.pack(0, 10) + b'12345')
+		stdout.flush()
+		sys.exit(0)
+	elif payload == b'pid':
+		payload = str(os.getpid()).encode()
+	stdout.write(header.pack(0, len(payload)) + payload)
+	stdout.flush()
+'''
+
+@pytest.fixture
+def stub_workers(monkeypatch):
+	async def spawn(cls, limits=image.ImageLimits()):
+		proc = await asyncio.create_subprocess_exec(
+			sys.executable, '-c', STUB_WORKER, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE)
+		return cls(proc)
+
+	monkeypatch.setattr(image.ImageWorker, 'spawn', classmethod(spawn))
+
+def run_jobs(*payloads, **pool_kwargs):
+	"""run each payload as a convert job in a fresh pool, returning the results or exceptions, and the pool"""
+	async def main():
+		pool = image.ImageWorkerPool(**pool_kwargs)
+		await pool.start()
+		results = []
+		try:
+			for payload in payloads:
+				try:
+					results.append(await pool.process('convert', payload))
+				except Exception as exc:
+					results.append(exc)
+		finally:
+			await pool.close()
+		return results, pool
+
+	return asyncio.run(main())
+
+def test_round_trip(stub_workers):
+	big = bytes(range(256)) * 4096
+	results, pool = run_jobs(b'hello', b'', big, size=1)
+	assert results == [b'hello', b'', big]
+	assert pool.processed == 3
+
+def test_truncated_response(stub_workers):
+	(result, after), pool = run_jobs(b'truncate', b'after', size=1)
+	assert type(result) is RuntimeError
+	# the broken worker was replaced
+	assert after == b'after'
+
+def test_recycle_after_max_jobs(stub_workers):
+	pids, pool = run_jobs(b'pid', b'pid', b'pid', b'pid', size=1, max_jobs=2)
+	assert pids[0] == pids[1] != pids[2] == pids[3]
+
+def test_start_counts_busy_workers(stub_workers):
+	async def main():
+		pool = image.ImageWorkerPool(size=2)
+		try:
+			# on-demand spawns for these jobs race with start()
+			results = await asyncio.gather(pool.start(), *(pool.process('convert', b'pid') for _ in range(2)), pool.start())
+			await asyncio.sleep(0.1)
+			assert pool.live_workers <= pool.size
+			assert len(pool._idle) <= pool.size
+		finally:
+			await pool.close()
+		assert not pool.live_workers
+		return results
+
+	asyncio.run(main())
+
+def test_cpu_time_limit(stub_workers):
+	(result, after), pool = run_jobs(b'xcpu', b'after', size=1)
+	assert isinstance(result, errors.ImageResourceLimitError)
+	assert after == b'after'
+
+def test_killed_worker_is_not_a_resource_limit(stub_workers):
+	(result,), pool = run_jobs(b'kill', size=1)
+	assert type(result) is RuntimeError
+
+def test_timeout(stub_workers):
+	(result, after), pool = run_jobs(b'hang', b'after', size=1, timeout=0.5)
+	assert isinstance(result, errors.ImageConversionTimeoutError)
+	assert not isinstance(result, errors.ImageResourceLimitError)
+	assert after == b'after'
+
+def test_unresponsive_worker_fails_fast(stub_workers):
+	start = time.monotonic()
+	(result,), pool = run_jobs(b'close', size=1)
+	assert type(result) is RuntimeError
+	assert time.monotonic() - start < 3
+
+def test_worker_ignores_truncated_request():
+	proc = subprocess.run(
+		[sys.executable, '-m', 'utils.image', 'worker', json.dumps(image.ImageLimits()._asdict())],
+		input=image.FRAME_HEADER.pack(0, 10) + b'12345', stdout=subprocess.PIPE, timeout=30)
+	assert proc.returncode == 0
+	assert proc.stdout == b''
@@ -0,0 +1,83 @@
+import asyncio
+import types
+
+from utils.paginator import ComponentListPaginator, ListPaginator, PaginatorDispatcher
+
+class StubHTTP:
+	def __init__(self):
+		self.calls = []
+
+	async def request(self, route, **kwargs):
+		self.calls.append((route.method, route.path, kwargs.get('json')))
+		return {'id': '1234'}
+
+	async def edit_message(self, channel_id, message_id, **fields):
+		self.calls.append(('PATCH', message_id, fields))
+
+	async def delete_message(self, channel_id, message_id):
+		self.calls.append(('DELETE', message_id, None))
+
+class StubBot:
+	def __init__(self):
+		self.loop = asyncio.get_running_loop()
+		self.http = StubHTTP()
+
+	def add_listener(self, listener):
+		pass
+
+	def remove_listener(self, listener):
+		pass
+
+def stub_context():
+	return types.SimpleNamespace(
+		bot=StubBot(), author=types.SimpleNamespace(id=1), channel=types.SimpleNamespace(id=2))
+
+def interaction(message_id, custom_id, *, user_id=1):
+	return {'t': 'INTERACTION_CREATE', 'd': {
+		'type': PaginatorDispatcher.INTERACTION_TYPE_COMPONENT, 'id': '5', 'token': 'token',
+		'message': {'id': str(message_id)}, 'member': {'user': {'id': str(user_id)}},
+		'data': {'custom_id': custom_id}}}
+
+def test_stop_before_first_page():
+	async def main():
+		for cls in ListPaginator, ComponentListPaginator:
+			await cls(stub_context(), ['a']).stop()
+
+	asyncio.run(main())
+
+def test_reaction_paginator_ignores_interactions():
+	async def main():
+		context = stub_context()
+		paginator = ListPaginator(context, ['a'])
+		paginator._message = types.SimpleNamespace(id=1234)
+		dispatcher = PaginatorDispatcher.for_bot(context.bot)
+		dispatcher.register(paginator)
+		await dispatcher.on_socket_response(interaction(1234, 'em-page:next:1'))
+		dispatcher.uninstall()
+
+	asyncio.run(main())
+
+def test_component_paginator_buttons():
+	async def main():
+		context = stub_context()
+		paginator = ComponentListPaginator(context, range(25))
+		task = asyncio.ensure_future(paginator.begin())
+		await asyncio.sleep(0)
+		dispatcher = PaginatorDispatcher.for_bot(context.bot)
+		await dispatcher.on_socket_response(interaction(1234, 'em-page:next:1'))
+		await dispatcher.on_socket_response(interaction(1234, 'em-page:stop:1', user_id=3))
+		await dispatcher.on_socket_response(interaction(1234, 'em-page:stop:1'))
+		await task
+		dispatcher.uninstall()
+		return paginator, context.bot.http.calls
+
+	paginator, calls = asyncio.run(main())
+	assert paginator._page == 1
+	sent, turned, refused, stopped = calls
+	assert sent[:2] == ('POST', '/channels/{channel_id}/messages')
+	assert sent[2]['components']
+	assert turned[1] == '/interactions/{interaction_id}/{interaction_token}/callback'
+	assert turned[2]['type'] == paginator.RESPONSE_UPDATE
+	assert refused[2]['type'] == paginator.RESPONSE_MESSAGE
+	assert stopped[2]['type'] == paginator.RESPONSE_UPDATE
+	assert stopped[2]['data']['components'] == []
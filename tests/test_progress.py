@@ -0,0 +1,70 @@
+import asyncio
+import gc
+import types
+
+import discord
+
+from utils.progress import ProgressMessage
+
+def http_exception():
+	return discord.HTTPException(types.SimpleNamespace(status=500, reason='Internal Server Error'), 'oops')
+
+class StubMessage:
+	def __init__(self, content):
+		self.content = content
+
+	async def edit(self, *, content):
+		self.content = content
+
+class StubContext:
+	def __init__(self, *, failures=0):
+		self.failures = failures
+		self.messages = []
+
+	async def send(self, content=None, **kwargs):
+		if self.failures:
+			self.failures -= 1
+			raise http_exception()
+		message = StubMessage(content)
+		self.messages.append(message)
+		return message
+
+def test_failed_send_is_retried():
+	async def main():
+		unhandled = []
+		asyncio.get_running_loop().set_exception_handler(lambda loop, context: unhandled.append(context))
+		context = StubContext(failures=1)
+		progress = ProgressMessage(context)
+		progress.EDIT_INTERVAL = 0
+		progress.add('a')
+		await asyncio.sleep(0.01)
+		assert not context.messages
+		await progress.finish()
+		gc.collect()
+		return context.messages, unhandled
+
+	messages, unhandled = asyncio.run(main())
+	assert [message.content for message in messages] == ['a']
+	assert not unhandled
+
+def test_finish_waits_for_a_flush_in_progress():
+	async def main():
+		sending = asyncio.Event()
+
+		class SlowContext(StubContext):
+			async def send(self, content=None, **kwargs):
+				sending.set()
+				await asyncio.sleep(0.01)
+				return await super().send(content, **kwargs)
+
+		context = SlowContext()
+		progress = ProgressMessage(context)
+		progress.EDIT_INTERVAL = 0
+		progress.add('a')
+		await sending.wait()
+		progress.add('b')
+		await progress.finish()
+		return context.messages
+
+	messages = asyncio.run(main())
+	assert [message.content for message in messages] == ['a\nb']
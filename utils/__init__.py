@@ -1,9 +1,14 @@
 #!/usr/bin/env python3
 
 from .misc import *
+from . import admission
 from . import archive
+from . import cache
+from . import ec
 from . import emote
 from . import errors
+from . import http
 from . import paginator
+from . import progress
 # note: do not import .image in case the user doesn't want it
 # since importing image can take a long time.
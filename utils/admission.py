@@ -0,0 +1,148 @@
+# © 2018–2020 io mintz <io@mintz.cc>
+#
+# Emote Manager is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# Emote Manager is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Emote Manager. If not, see <https://www.gnu.org/licenses/>.
+
+"""admission control for heavy commands, shared fairly between guilds"""
+
+import asyncio
+import collections
+import contextlib
+import typing
+
+"""
+Job classes: the resources that heavy commands compete for.
+
+image: CPU time in the image workers
+download: bandwidth for downloading emotes and archives
+archive: memory for building or extracting archives
+"""
+JOB_CLASSES = ('image', 'download', 'archive')
+
+_Waiter = collections.namedtuple('_Waiter', 'guild_id job_classes future')
+
+class AdmissionController:
+	"""Limits how many heavy jobs run at once, globally for each job class and in total for each guild.
+
+	A job needs one slot of each of its job classes, which it acquires all at once.
+	Jobs which can't start yet wait in a queue per guild, and the guilds take turns,
+	so that one guild starting many jobs can't starve the others.
+	"""
+
+	def __init__(self, budgets: typing.Mapping[str, int], *, per_guild=1, loop=None):
+		self.budgets = dict(budgets)
+		self.per_guild = per_guild
+		self.loop = loop or asyncio.get_event_loop()
+		self.in_use = collections.Counter()
+		self._running = collections.Counter()  # guild ID -> running jobs
+		# guild ID -> waiting jobs, in the order that the guilds will next be considered
+		self._queues = collections.OrderedDict()
+
+	@contextlib.asynccontextmanager
+	async def admit(self, guild_id, job_classes: typing.Iterable[str], *, on_queued=None):
+		"""Run a job for guild_id which needs job_classes, within an `async with` block.
+
+		If the job has to wait, on_queued is first awaited with the job's 1-indexed position in the queue.
+		"""
+		job_classes = frozenset(job_classes)
+		unknown = job_classes - self.budgets.keys()
+		if unknown:
+			raise ValueError(f'unknown job classes: {", ".join(sorted(unknown))}')
+
+		if not self._queues and self._can_run(guild_id, job_classes):
+			self._start(guild_id, job_classes)
+		else:
+			await self._wait(guild_id, job_classes, on_queued)
+
+		try:
+			yield
+		finally:
+			self._finish(guild_id, job_classes)
+
+	async def _wait(self, guild_id, job_classes, on_queued):
+		waiter = _Waiter(guild_id, job_classes, self.loop.create_future())
+		self._queues.setdefault(guild_id, collections.deque()).append(waiter)
+		# the guilds ahead of us may all be blocked on something we don't need
+		self._admit_waiting()
+		try:
+			if on_queued is not None and not waiter.future.done():
+				await on_queued(self.position(waiter))
+			await waiter.future
+		except BaseException:
+			if waiter.future.done() and not waiter.future.cancelled():
+				# we were admitted just as we gave up waiting
+				self._finish(guild_id, job_classes)
+			else:
+				waiter.future.cancel()
+				self._remove(waiter)
+			raise
+
+	def position(self, waiter) -> int:
+		"""Return where waiter is in the queue, assuming the guilds keep taking turns."""
+		queues = [list(queue) for queue in self._queues.values()]
+		position = 0
+		for turn in range(max(map(len, queues), default=0)):
+			for queue in queues:
+				if turn < len(queue):
+					position += 1
+					if queue[turn] is waiter:
+						return position
+		raise ValueError('waiter is not queued')
+
+	def _can_run(self, guild_id, job_classes):
+		return (
+			self._running[guild_id] < self.per_guild
+			and all(self.in_use[job_class] < self.budgets[job_class] for job_class in job_classes))
+
+	def _start(self, guild_id, job_classes):
+		self._running[guild_id] += 1
+		self.in_use.update(job_classes)
+
+	def _finish(self, guild_id, job_classes):
+		self._running[guild_id] -= 1
+		if not self._running[guild_id]:
+			del self._running[guild_id]
+		self.in_use.subtract(job_classes)
+		self._admit_waiting()
+
+	def _remove(self, waiter):
+		queue = self._queues.get(waiter.guild_id)
+		if queue is None:
+			return
+		with contextlib.suppress(ValueError):
+			queue.remove(waiter)
+		if not queue:
+			self._queues.pop(waiter.guild_id, None)
+		# a job behind this one in another guild may have been blocked only by this one's turn
+		self._admit_waiting()
+
+	def _admit_waiting(self):
+		"""Start every waiting job that now can, giving each guild one turn at a time."""
+		admitted = True
+		while admitted:
+			admitted = False
+			for guild_id, queue in list(self._queues.items()):
+				waiter = queue[0]
+				if not self._can_run(guild_id, waiter.job_classes):
+					continue
+
+				queue.popleft()
+				# this guild has had its turn, so it goes to the back of the line
+				del self._queues[guild_id]
+				if queue:
+					self._queues[guild_id] = queue
+
+				self._start(guild_id, waiter.job_classes)
+				waiter.future.set_result(None)
+				admitted = True
+				break
@@ -15,9 +15,14 @@
 
 import asyncio
 import collections
+import contextlib
 import enum
+import io
+import mmap
 import posixpath
 import tarfile
+import tempfile
+import threading
 import typing.io
 import zipfile
 from typing import Iterable, Tuple, Optional
@@ -25,6 +30,8 @@ from typing import Iterable, Tuple, Optional
 from . import errors
 
 ArchiveInfo = collections.namedtuple('ArchiveInfo', 'filename content error')
+# wraps an exception raised while extracting in a thread so that it can be re-raised by the consumer
+_ExtractionError = collections.namedtuple('_ExtractionError', 'exc')
 
 def extract(archive: typing.io.BinaryIO, *, size_limit=None) \
 	-> Iterable[Tuple[str, Optional[bytes], Optional[BaseException]]]:
@@ -82,9 +89,124 @@ def extract_tar(archive, *, size_limit=None):
 
 			yield ArchiveInfo(member.name, content=tar.extractfile(member).read(), error=None)
 
-async def extract_async(archive: typing.io.BinaryIO, size_limit=None):
-	for x in extract(archive, size_limit=size_limit):
-		yield await asyncio.sleep(0, x)
+async def extract_async(archive: typing.io.BinaryIO, size_limit=None, *, max_pending=2, executor=None):
+	"""like extract, but parse and decompress the archive in a thread so that the event loop stays responsive.
+
+	At most max_pending members are read ahead of the consumer. The archive must not be used by anything else
+	until iteration is finished.
+	"""
+	loop = asyncio.get_running_loop()
+	queue = asyncio.Queue(max_pending)
+	stopped = threading.Event()
+	done = object()
+
+	def put(item):
+		# blocks the extraction thread while the queue is full
+		asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+	def produce():
+		try:
+			for info in extract(archive, size_limit=size_limit):
+				if stopped.is_set():
+					return
+				put(info)
+		except BaseException as exc:
+			if not stopped.is_set():
+				put(_ExtractionError(exc))
+		else:
+			if not stopped.is_set():
+				put(done)
+
+	producer = loop.run_in_executor(executor, produce)
+	try:
+		while True:
+			item = await queue.get()
+			if item is done:
+				break
+			if type(item) is _ExtractionError:
+				raise item.exc
+			yield item
+	finally:
+		stopped.set()
+		# unblock the producer if it's waiting for room in the queue
+		while not queue.empty():
+			queue.get_nowait()
+		await producer
+
+class SpooledArchive:
+	"""A write-once buffer for a downloaded archive.
+
+	It is kept in memory while small and moved to an anonymous temporary file once it grows past max_size.
+	Reading it back with open() memory-maps the temporary file, so the OS pages the archive in on demand
+	and resident memory stays bounded no matter how big the archive is.
+	"""
+
+	def __init__(self, max_size=8 * 2**20):
+		self.max_size = max_size
+		self._file = io.BytesIO()
+		self._on_disk = False
+
+	def write(self, data):
+		if not self._on_disk and self._file.tell() + len(data) > self.max_size:
+			file = tempfile.TemporaryFile()
+			file.write(self._file.getbuffer())
+			self._file = file
+			self._on_disk = True
+		return self._file.write(data)
+
+	def tell(self):
+		return self._file.tell()
+
+	@contextlib.contextmanager
+	def open(self) -> typing.Iterator[typing.io.BinaryIO]:
+		"""Return a seekable, read-only file object over everything written so far."""
+		if not self._on_disk:
+			self._file.seek(0)
+			yield self._file
+			return
+
+		self._file.flush()
+		if self._file.tell() == 0:
+			# empty files can't be mapped
+			yield io.BytesIO()
+			return
+
+		with mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) as map:
+			yield io.BufferedReader(_MappedFile(map))
+
+	def close(self):
+		self._file.close()
+
+class _MappedFile(io.RawIOBase):
+	"""A raw file object over an mmap, which zipfile and tarfile can read from."""
+
+	def __init__(self, map):
+		self._map = map
+		self._pos = 0
+
+	def readable(self):
+		return True
+
+	def seekable(self):
+		return True
+
+	def readinto(self, b):
+		with memoryview(self._map) as view, view[self._pos:self._pos + len(b)] as chunk, memoryview(b) as out:
+			n = len(chunk)
+			out.cast('B')[:n] = chunk
+		self._pos += n
+		return n
+
+	def seek(self, offset, whence=io.SEEK_SET):
+		if whence == io.SEEK_CUR:
+			offset += self._pos
+		elif whence == io.SEEK_END:
+			offset += len(self._map)
+		self._pos = max(0, offset)
+		return self._pos
+
+	def tell(self):
+		return self._pos
 
 def main():
 	import io
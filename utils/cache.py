@@ -0,0 +1,251 @@
+# © 2018–2020 io mintz <io@mintz.cc>
+#
+# Emote Manager is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# Emote Manager is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Emote Manager. If not, see <https://www.gnu.org/licenses/>.
+
+"""caches for data which is expensive to retrieve"""
+
+import asyncio
+import collections
+import contextlib
+import logging
+import os
+import tempfile
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+class EmoteImageCache:
+	"""A size-bounded LRU cache of emote images, on disk with a smaller in-memory tier in front of it.
+
+	The image for a given emote ID never changes, so entries never need to be invalidated.
+	Files are stored as <path>/<last two digits of the ID>/<ID>.<png or gif>
+	and are written atomically, so a crash never leaves a truncated image in the cache.
+	"""
+
+	def __init__(self, path, *, max_bytes=512 * 2**20, memory_bytes=32 * 2**20, loop=None):
+		self.path = path
+		self.max_bytes = max_bytes
+		self.memory_bytes = memory_bytes
+		self.loop = loop or asyncio.get_event_loop()
+
+		# filename -> size in bytes, least recently used first
+		self._disk = collections.OrderedDict()
+		self._disk_bytes = 0
+		# filename -> image data, least recently used first
+		self._memory = collections.OrderedDict()
+		self._memory_bytes = 0
+
+		self._loaded = None
+		self.hits = self.misses = 0
+
+	@staticmethod
+	def filename(id, animated: bool):
+		return f'{id}.{"gif" if animated else "png"}'
+
+	def _path_for(self, filename):
+		return os.path.join(self.path, filename[:filename.index('.')][-2:], filename)
+
+	async def get(self, id, animated: bool) -> Optional[bytes]:
+		"""Return the cached image for the given emote, or None if it's not cached."""
+		filename = self.filename(id, animated)
+
+		with contextlib.suppress(KeyError):
+			self._memory.move_to_end(filename)
+			self._disk.move_to_end(filename)
+			self.hits += 1
+			return self._memory[filename]
+
+		await self._ensure_loaded()
+		if filename not in self._disk:
+			self.misses += 1
+			return None
+
+		try:
+			data = await self.loop.run_in_executor(None, self._read, self._path_for(filename))
+		except FileNotFoundError:
+			# someone else evicted it in the meantime
+			self._forget(filename)
+			self.misses += 1
+			return None
+
+		with contextlib.suppress(KeyError):
+			self._disk.move_to_end(filename)
+		self._remember(filename, data)
+		self.hits += 1
+		return data
+
+	async def put(self, id, animated: bool, data: bytes):
+		"""Add an image to the cache, evicting the least recently used images if necessary."""
+		if len(data) > self.max_bytes:
+			return
+
+		filename = self.filename(id, animated)
+		await self._ensure_loaded()
+		try:
+			await self.loop.run_in_executor(None, self._write, self._path_for(filename), data)
+		except OSError:
+			logger.exception('failed to write %s to the emote image cache', filename)
+			return
+
+		self._forget(filename)
+		self._disk[filename] = len(data)
+		self._disk_bytes += len(data)
+		self._remember(filename, data)
+
+		evicted = []
+		while self._disk_bytes > self.max_bytes:
+			old_filename, _ = next(iter(self._disk.items()))
+			self._forget(old_filename)
+			evicted.append(self._path_for(old_filename))
+		if evicted:
+			await self.loop.run_in_executor(None, self._unlink_all, evicted)
+
+	def _remember(self, filename, data):
+		# don't let one giant image flush out everything else
+		if len(data) > self.memory_bytes // 16:
+			return
+		with contextlib.suppress(KeyError):
+			self._memory_bytes -= len(self._memory.pop(filename))
+		self._memory[filename] = data
+		self._memory_bytes += len(data)
+		while self._memory_bytes > self.memory_bytes:
+			_, old_data = self._memory.popitem(last=False)
+			self._memory_bytes -= len(old_data)
+
+	def _forget(self, filename):
+		with contextlib.suppress(KeyError):
+			self._disk_bytes -= self._disk.pop(filename)
+		with contextlib.suppress(KeyError):
+			self._memory_bytes -= len(self._memory.pop(filename))
+
+	async def _ensure_loaded(self):
+		if self._loaded is None:
+			self._loaded = self.loop.create_task(self._load())
+		await self._loaded
+
+	async def _load(self):
+		entries = await self.loop.run_in_executor(None, self._scan)
+		for filename, size in entries:
+			self._disk.setdefault(filename, size)
+		self._disk_bytes = sum(self._disk.values())
+		logger.info('emote image cache: %s images, %s bytes', len(self._disk), self._disk_bytes)
+
+	def _scan(self):
+		"""Return (filename, size) for every file already in the cache, least recently used first."""
+		entries = []
+		os.makedirs(self.path, exist_ok=True)
+		for dirpath, _, filenames in os.walk(self.path):
+			for filename in filenames:
+				if filename.startswith('.'):  # stale temp files
+					with contextlib.suppress(OSError):
+						os.unlink(os.path.join(dirpath, filename))
+					continue
+				with contextlib.suppress(OSError):
+					st = os.stat(os.path.join(dirpath, filename))
+					entries.append((st.st_mtime, filename, st.st_size))
+		entries.sort()
+		return [(filename, size) for _, filename, size in entries]
+
+	@staticmethod
+	def _read(path):
+		with open(path, 'rb') as f:
+			data = f.read()
+		# mtime is what determines the LRU order when the cache is next loaded
+		with contextlib.suppress(OSError):
+			os.utime(path)
+		return data
+
+	@staticmethod
+	def _write(path, data):
+		dirname = os.path.dirname(path)
+		os.makedirs(dirname, exist_ok=True)
+		fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix='.')
+		try:
+			with os.fdopen(fd, 'wb') as f:
+				f.write(data)
+			os.replace(tmp_path, path)
+		except BaseException:
+			with contextlib.suppress(OSError):
+				os.unlink(tmp_path)
+			raise
+
+	@staticmethod
+	def _unlink_all(paths):
+		for path in paths:
+			with contextlib.suppress(FileNotFoundError):
+				os.unlink(path)
+
+class TTLCache:
+	"""An LRU cache whose entries also expire a fixed time after they were added.
+
+	Concurrent lookups of a key that isn't cached share a single call to the fetch function.
+	"""
+
+	def __init__(self, *, ttl, max_entries, loop=None):
+		self.ttl = ttl
+		self.max_entries = max_entries
+		self.loop = loop or asyncio.get_event_loop()
+		# key -> (expiry time, value), least recently used first
+		self._entries = collections.OrderedDict()
+		# key -> task fetching that key
+		self._pending = {}
+		self.hits = self.misses = 0
+
+	def __len__(self):
+		return len(self._entries)
+
+	async def get(self, key, fetch):
+		"""Return the value for key, awaiting fetch() to retrieve it if it's not cached.
+
+		Exceptions raised by fetch() are propagated to every caller waiting on it and are not cached.
+		"""
+		with contextlib.suppress(KeyError):
+			expires, value = self._entries[key]
+			if time.monotonic() < expires:
+				self._entries.move_to_end(key)
+				self.hits += 1
+				return value
+			del self._entries[key]
+
+		self.misses += 1
+		try:
+			task = self._pending[key]
+		except KeyError:
+			task = self._pending[key] = self.loop.create_task(fetch())
+			task.add_done_callback(lambda task: self._fetched(key, task))
+
+		# one caller being cancelled must not cancel the lookup for everyone else
+		return await asyncio.shield(task)
+
+	def _fetched(self, key, task):
+		# if the key was invalidated during the lookup, the result may already be stale
+		if self._pending.get(key) is not task:
+			return
+		del self._pending[key]
+		if task.cancelled() or task.exception() is not None:
+			return
+
+		self._entries[key] = time.monotonic() + self.ttl, task.result()
+		self._entries.move_to_end(key)
+		while len(self._entries) > self.max_entries:
+			self._entries.popitem(last=False)
+
+	def invalidate(self, key):
+		self._entries.pop(key, None)
+		self._pending.pop(key, None)
+
+	def clear(self):
+		self._entries.clear()
+		self._pending.clear()
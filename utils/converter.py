@@ -15,9 +15,12 @@
 
 import functools
 
+def all_emote_types(_):
+	return True
+
 _emote_type_predicates = {
-	'': lambda _: True,  # allow usage as a "consume rest" converter
-	'all': lambda _: True,
+	'': all_emote_types,  # allow usage as a "consume rest" converter
+	'all': all_emote_types,
 	'static': lambda e: not e.animated,
 	'animated': lambda e: e.animated}
 
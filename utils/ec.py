@@ -0,0 +1,92 @@
+# © 2018–2020 io mintz <io@mintz.cc>
+#
+# Emote Manager is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# Emote Manager is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Emote Manager. If not, see <https://www.gnu.org/licenses/>.
+
+"""a caching wrapper around the Emote Collector API client"""
+
+import asyncio
+import types
+
+import aioec
+import aiohttp
+
+from .cache import TTLCache
+
+# cached in place of an emote that doesn't exist. Each lookup of it raises a new aioec.NotFound,
+# since raising a single cached exception again would keep extending its traceback.
+_NOT_FOUND = object()
+# aioec.NotFound needs a response, but the one from the original lookup isn't kept
+_NOT_FOUND_RESPONSE = types.SimpleNamespace(status=404, reason='Not Found')
+
+class SharedConnectorClient(aioec.Client):
+	"""An aioec.Client whose session uses connector without owning it, so that closing the client leaves it open.
+
+	aioec always gives its session ownership of the connector, so that session is swapped for one that doesn't.
+	"""
+
+	def __init__(self, token=None, *, connector, trace_configs=(), loop=None, base_url=None):
+		super().__init__(token, loop=loop, base_url=base_url, connector=connector)
+		owning_session = self._http._session
+		self._http._session = aiohttp.ClientSession(
+			headers=owning_session.headers,
+			loop=self._http.loop,
+			connector=connector,
+			connector_owner=False,
+			trace_configs=list(trace_configs))
+		# closes the owning session without closing the connector
+		owning_session.detach()
+
+class CachedECClient:
+	"""Wraps an aioec.Client, caching emote lookups, including ones for emotes that don't exist.
+
+	Emote Collector entries rarely change, so a few minutes of staleness is acceptable.
+	"""
+
+	def __init__(self, client: aioec.Client, *, ttl=600, max_entries=1000, concurrency=4, loop=None):
+		self.client = client
+		self.loop = loop or asyncio.get_event_loop()
+		# name -> aioec.Emote or _NOT_FOUND
+		self._cache = TTLCache(ttl=ttl, max_entries=max_entries, loop=self.loop)
+		self._lookups = asyncio.Semaphore(concurrency)
+
+	async def emote(self, name) -> aioec.Emote:
+		"""Look up an emote by name. Raises aioec.NotFound if it doesn't exist."""
+		result = await self._cache.get(name, lambda: self._fetch(name))
+		if result is _NOT_FOUND:
+			raise aioec.NotFound(_NOT_FOUND_RESPONSE, f'Emote {name} not found')
+		return result
+
+	async def _fetch(self, name):
+		async with self._lookups:
+			try:
+				return await self.client.emote(name)
+			except aioec.NotFound:
+				return _NOT_FOUND
+
+	async def emotes(self, names):
+		"""Look up many emotes concurrently.
+
+		Returns a list with, for each name in order, either the aioec.Emote or the aioec.HttpException raised.
+		Any other error, such as an invalid token, is raised.
+		"""
+		async def lookup(name):
+			try:
+				return await self.emote(name)
+			except aioec.HttpException as exception:
+				return exception
+
+		return await asyncio.gather(*map(lookup, names))
+
+	def close(self):
+		return self.client.close()
@@ -13,7 +13,9 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with Emote Manager. If not, see <https://www.gnu.org/licenses/>.
 
+import collections
 import re
+import typing
 
 """
 various utilities related to custom emotes
@@ -23,9 +25,83 @@ various utilities related to custom emotes
 RE_EMOTE = re.compile(r'(:|;)(?P<name>\w{2,32})\1|(?P<newline>\n)', re.ASCII)
 
 """Matches only custom server emotes."""
-RE_CUSTOM_EMOTE = re.compile(r'<(?P<animated>a?):(?P<name>\w{2,32}):(?P<id>\d{17,})>', re.ASCII)
+RE_CUSTOM_EMOTE = re.compile(r'<(?P<animated>a?):(?P<name>\w{2,32}):(?P<id>\d{17,20})>', re.ASCII)
+
+"""Matches a link to a message. guild_id is "@me" for messages in DMs."""
+RE_MESSAGE_LINK = re.compile(
+	r'<?https://(?:(?:ptb|canary)\.)?discord(?:app)?\.com/channels/'
+	r'(?P<guild_id>\d{17,20}|@me)/(?P<channel_id>\d{17,20})/(?P<message_id>\d{17,20})>?',
+	re.ASCII)
+
+"""Matches the CDN URL of a custom emote's image."""
+RE_EMOTE_URL = re.compile(
+	r'https://cdn\.discordapp\.com/emojis/(?P<id>\d{17,})\.(?P<extension>png|gif)(?:\?.*)?', re.ASCII)
 
 def url(id, *, animated: bool = False):
 	"""Convert an emote ID to the image URL for that emote."""
 	extension = 'gif' if animated else 'png'
 	return f'https://cdn.discordapp.com/emojis/{id}.{extension}?v=1'
+
+def parse_url(url):
+	"""Return (id, animated) for the CDN URL of an emote image, or None if the URL is not one."""
+	match = RE_EMOTE_URL.fullmatch(url)
+	if match is None:
+		return None
+	return int(match['id']), match['extension'] == 'gif'
+
+class ParsedEmote(collections.namedtuple('ParsedEmote', 'name id animated')):
+	"""A custom emote parsed from text."""
+	__slots__ = ()
+
+	@classmethod
+	def from_match(cls, match):
+		return cls(name=match['name'], id=int(match['id']), animated=bool(match['animated']))
+
+	@property
+	def url(self):
+		return url(self.id, animated=self.animated)
+
+	def __str__(self):
+		return f'<{"a" if self.animated else ""}:{self.name}:{self.id}>'
+
+def parse_custom_emote(s) -> typing.Optional[ParsedEmote]:
+	"""Parse a custom emote at the start of s, returning None if there isn't one."""
+	match = RE_CUSTOM_EMOTE.match(s)
+	return None if match is None else ParsedEmote.from_match(match)
+
+def find_custom_emotes(text) -> typing.List[ParsedEmote]:
+	"""Return every distinct custom emote in text, in the order they first appear."""
+	# dicts preserve insertion order, so this deduplicates in one pass
+	return list(dict.fromkeys(map(ParsedEmote.from_match, RE_CUSTOM_EMOTE.finditer(text))))
+
+MessageLink = collections.namedtuple('MessageLink', 'guild_id channel_id message_id')
+
+def parse_message_link(link) -> typing.Optional[MessageLink]:
+	"""Parse a link to a message. guild_id is None for messages in DMs."""
+	match = RE_MESSAGE_LINK.fullmatch(link)
+	if match is None:
+		return None
+	guild_id = None if match['guild_id'] == '@me' else int(match['guild_id'])
+	return MessageLink(guild_id, int(match['channel_id']), int(match['message_id']))
+
+class EmoteIndex:
+	"""A snapshot of a guild's emotes, indexed for fast lookups by name and ID."""
+
+	def __init__(self, emotes):
+		self.by_id = {}
+		self.by_name = collections.defaultdict(list)
+		self.counts = collections.Counter()
+		for emote in emotes:
+			self.by_id[emote.id] = emote
+			self.by_name[emote.name.casefold()].append(emote)
+			self.counts[emote.animated] += 1
+
+		# all the emotes, sorted by name
+		self.sorted = tuple(sorted(self.by_id.values(), key=lambda e: e.name.casefold()))
+
+	def __len__(self):
+		return len(self.by_id)
+
+	def find(self, name):
+		"""Return all emotes whose name matches the given name case-insensitively."""
+		return self.by_name.get(name.casefold(), ())
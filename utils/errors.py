@@ -44,6 +44,11 @@ class ImageConversionTimeoutError(ImageProcessingTimeoutError):
 	def __init__(self):
 		super().__init__('Error: converting the image to a GIF took too long.')
 
+class ImageResourceLimitError(ImageProcessingTimeoutError):
+	"""Processing the image needed more memory or CPU time than an image worker is allowed."""
+	def __init__(self):
+		super().__init__('Error: the image is too large or complex to process.')
+
 class HTTPException(EmoteManagerError):
 	"""The server did not respond with an OK status code."""
 	def __init__(self, status):
@@ -0,0 +1,131 @@
+# © 2018–2020 io mintz <io@mintz.cc>
+#
+# Emote Manager is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# Emote Manager is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Emote Manager. If not, see <https://www.gnu.org/licenses/>.
+
+"""a shared, tuned HTTP connection pool"""
+
+import asyncio
+import collections
+import time
+
+import aiohttp
+
+PoolStats = collections.namedtuple('PoolStats', 'limit limit_per_host in_use requests waiting waits wait_time created reused')
+
+class ConnectionPool:
+	"""Connectors shared by every HTTP session the bot makes, outside of discord.py.
+
+	`connector` is for general use. `proxy_connector` is for the Emote Collector API.
+	They are the same connector unless a SOCKS proxy is configured only for the latter.
+	Sessions using these connectors must not own them (connector_owner=False), since only close() closes them.
+	Sessions should also use `trace_config`, so that their requests are counted in stats().
+	"""
+
+	def __init__(
+		self, *,
+		limit=100, limit_per_host=10, keepalive_timeout=30, dns_cache_ttl=300,
+		proxy_url=None, proxy_all=False, loop=None,
+	):
+		self.loop = loop or asyncio.get_event_loop()
+		self._options = dict(
+			limit=limit,
+			limit_per_host=limit_per_host,
+			keepalive_timeout=keepalive_timeout,
+			ttl_dns_cache=dns_cache_ttl,
+			loop=self.loop)
+
+		self.connector = self._connector(proxy_url if proxy_all else None)
+		if proxy_url and not proxy_all:
+			self.proxy_connector = self._connector(proxy_url)
+		else:
+			self.proxy_connector = self.connector
+
+		self._requests = self._in_use = self._waiting = self._waits = self._created = self._reused = 0
+		self._wait_time = 0.0
+		self.trace_config = self._make_trace_config()
+
+	def _connector(self, proxy_url=None):
+		if proxy_url is None:
+			return aiohttp.TCPConnector(**self._options)
+
+		from aiohttp_socks import SocksConnector
+		return SocksConnector.from_url(proxy_url, rdns=True, **self._options)
+
+	def _make_trace_config(self):
+		trace_config = aiohttp.TraceConfig()
+
+		async def on_request_start(session, context, params):
+			self._requests += 1
+
+		async def on_connection_queued_start(session, context, params):
+			self._waiting += 1
+			self._waits += 1
+			context.queued_at = time.perf_counter()
+
+		async def on_connection_queued_end(session, context, params):
+			self._waiting -= 1
+			self._wait_time += time.perf_counter() - context.queued_at
+
+		def acquired(context):
+			self._in_use += 1
+			context.holds_connection = True
+
+		# aiohttp has no hook for a connection being released, so count it as released once the response
+		# headers arrive, or the request fails or is redirected, whichever comes first
+		async def released(session, context, params):
+			if getattr(context, 'holds_connection', False):
+				self._in_use -= 1
+				context.holds_connection = False
+
+		async def on_connection_create_end(session, context, params):
+			self._created += 1
+			acquired(context)
+
+		async def on_connection_reuseconn(session, context, params):
+			self._reused += 1
+			acquired(context)
+
+		trace_config.on_request_start.append(on_request_start)
+		trace_config.on_connection_queued_start.append(on_connection_queued_start)
+		trace_config.on_connection_queued_end.append(on_connection_queued_end)
+		trace_config.on_connection_create_end.append(on_connection_create_end)
+		trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+		trace_config.on_request_redirect.append(released)
+		trace_config.on_request_end.append(released)
+		trace_config.on_request_exception.append(released)
+		return trace_config
+
+	def stats(self) -> PoolStats:
+		"""Statistics for the sessions using `trace_config`, counted since the pool was created.
+
+		in_use counts connections held by requests which are still waiting for their response headers;
+		connections held while a response body is read are not counted.
+		waiting and waits count requests which had to wait for a free connection
+		because the total or per-host limit was reached, now and in total.
+		"""
+		return PoolStats(
+			limit=self.connector.limit,
+			limit_per_host=self.connector.limit_per_host,
+			in_use=self._in_use,
+			requests=self._requests,
+			waiting=self._waiting,
+			waits=self._waits,
+			wait_time=self._wait_time,
+			created=self._created,
+			reused=self._reused)
+
+	async def close(self):
+		await self.connector.close()
+		if self.proxy_connector is not self.connector:
+			await self.proxy_connector.close()
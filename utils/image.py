@@ -15,57 +15,214 @@
 
 import asyncio
 import base64
+import collections
 import contextlib
 import functools
 import io
+import json
 import logging
+import math
+import resource
 import signal
+import struct
 import sys
+import time
+import traceback
 import typing
 
 logger = logging.getLogger(__name__)
 
-try:
-	import wand.image
-except (ImportError, OSError):
-	logger.warn('Failed to import wand.image. Image manipulation functions will be unavailable.')
-else:
-	import wand.exceptions
-
 from utils import errors
 
-def resize_until_small(image_data: io.BytesIO) -> None:
-	"""If the image_data is bigger than 256KB, resize it until it's not."""
+# imported on first use by _import_wand(), since loading ImageMagick takes most of a second
+wand = None
+
+def _import_wand():
+	global wand
+	if wand is not None:
+		return
+	try:
+		import wand.api
+		import wand.exceptions
+		import wand.image
+		import wand.resource
+	except (ImportError, OSError):
+		logger.warning('Failed to import wand.image. Image manipulation functions will be unavailable.')
+		raise
+
+# Discord's limit on the file size of an emote
+MAX_EMOTE_SIZE = 256 * 2**10
+# don't resize past 32×32
+MIN_RESOLUTION = 32
+# stop bisecting once the bounds are within this many pixels of each other
+RESOLUTION_TOLERANCE = 4
+
+def resize_until_small(image_data: io.BytesIO) -> int:
+	"""If the image_data is bigger than 256KiB, resize it to the largest resolution that fits.
+
+	Returns the number of times a candidate image was encoded.
+	"""
 	# It's important that we only attempt to resize the image when we have to,
 	# ie when it exceeds the Discord limit of 256KiB.
 	# Apparently some <256KiB images become larger when we attempt to resize them,
 	# so resizing sometimes does more harm than good.
-	max_resolution = 128  # pixels
 	image_size = size(image_data)
-	if image_size <= 256 * 2**10:
-		return
+	if image_size <= MAX_EMOTE_SIZE:
+		return 0
 
+	_import_wand()
 	try:
 		with wand.image.Image(blob=image_data) as original_image:
-			while True:
-				logger.debug('image size too big (%s bytes)', image_size)
-				logger.debug('attempting resize to at most%s*%s pixels', max_resolution, max_resolution)
-
-				with original_image.clone() as resized:
-					resized.transform(resize=f'{max_resolution}x{max_resolution}')
-					image_size = len(resized.make_blob())
-					if image_size <= 256 * 2**10 or max_resolution < 32:  # don't resize past 256KiB or 32×32
-						image_data.truncate(0)
-						image_data.seek(0)
-						resized.save(file=image_data)
-						image_data.seek(0)
-						break
-
-				max_resolution //= 1.3333333333333333
+			resized = None
+			if original_image.format == 'GIF' and len(original_image.sequence) > 1 and _can_shrink_animations():
+				try:
+					resized, passes = _shrink_animation(original_image, image_size)
+				except wand.exceptions.WandException:
+					logger.warning('optimizing an animation failed; downscaling it instead', exc_info=True)
+			if resized is None:
+				resized, passes = _largest_resize_that_fits(original_image, image_size)
 	except wand.exceptions.CoderError:
 		raise errors.InvalidImageError
 
+	logger.debug('resized a %s byte image to %s bytes in %s passes', image_size, len(resized), passes)
+	image_data.truncate(0)
+	image_data.seek(0)
+	image_data.write(resized)
+	image_data.seek(0)
+	return passes
+
+def _largest_resize_that_fits(original_image, image_size, *, optimize=False) -> typing.Tuple[bytes, int]:
+	"""Bisect on the resolution of original_image to find the largest one whose encoding is at most 256KiB.
+
+	The image is only decoded once, by the caller; each candidate is a copy of the decoded frames.
+	If not even a 32×32 version fits, that version is returned anyway.
+	If optimize is True, original_image must be a coalesced animation, and each candidate is re-optimized.
+	"""
+	def encode(resolution):
+		logger.debug('attempting resize to at most %s*%s pixels', resolution, resolution)
+		with original_image.clone() as resized:
+			resized.transform(resize=f'{resolution}x{resolution}')
+			if optimize:
+				return _encode_animation(resized)
+			return resized.make_blob()
+
+	# never upscale
+	high = max(original_image.size)
+	low = min(MIN_RESOLUTION, high)
+	# the encoded size scales roughly with the pixel count, ie the square of the resolution,
+	# so predict a first candidate from that, erring on the small side so that it's likely to fit
+	resolution = int(high * math.sqrt(MAX_EMOTE_SIZE / image_size) * 0.95)
+	resolution = max(low, min(high, resolution))
+
+	best = smallest = None
+	passes = 0
+	while low <= high:
+		candidate = encode(resolution)
+		passes += 1
+		if resolution <= MIN_RESOLUTION:
+			smallest = candidate
+		if len(candidate) <= MAX_EMOTE_SIZE:
+			best = candidate
+			low = resolution + 1
+		else:
+			high = resolution - 1
+
+		if best is not None and high - low < RESOLUTION_TOLERANCE:
+			break
+		resolution = (low + high) // 2
+
+	if best is None and smallest is None:
+		smallest = encode(MIN_RESOLUTION)
+		passes += 1
+
+	return best or smallest, passes
+
+# cheap ways to make an animation smaller, in the order they're tried, before resorting to downscaling it.
+# Each is applied on top of the previous ones, and every candidate is encoded with only the changed parts
+# of each frame, see _encode_animation. Lossy LZW compression would be next, but ImageMagick can't do it.
+ANIMATION_STRATEGIES = ('quantize', 'decimate')
+# how many colors the quantize strategy reduces each frame of an animation to
+QUANTIZE_COLORS = 64
+
+def _can_shrink_animations():
+	"""whether the linked ImageMagick has everything _shrink_animation needs. Otherwise animations are only downscaled."""
+	return all(
+		getattr(wand.api.library, function, None)
+		for function in (
+			'MagickCoalesceImages', 'MagickOptimizeImageLayers', 'MagickOptimizeImageTransparency',
+			'MagickQuantizeImage'))
+
+StrategyResult = collections.namedtuple('StrategyResult', 'strategy size seconds')
+
+def _shrink_animation(original_image, image_size) -> typing.Tuple[bytes, int]:
+	"""Make an animated GIF fit in 256KiB, trying each of ANIMATION_STRATEGIES before downscaling it.
+
+	Returns the encoded image and the number of times a candidate was encoded.
+	"""
+	results = []
+	try:
+		with original_image.clone() as animation:
+			candidates = _animation_candidates(animation)
+			while True:
+				start = time.perf_counter()
+				try:
+					strategy, data = next(candidates)
+				except StopIteration:
+					break
+				results.append(StrategyResult(strategy, len(data), time.perf_counter() - start))
+				if len(data) <= MAX_EMOTE_SIZE:
+					return data, len(results)
+
+			start = time.perf_counter()
+			data, passes = _largest_resize_that_fits(animation, len(data), optimize=True)
+			results.append(StrategyResult('downscale', len(data), time.perf_counter() - start))
+			return data, len(results) - 1 + passes
+	finally:
+		logger.debug('shrunk a %s byte animation: %s', image_size, results)
+
+def _animation_candidates(animation):
+	"""Apply each of ANIMATION_STRATEGIES to animation in turn, yielding (strategy, encoded animation) after each.
+
+	animation is coalesced first, and is left with every strategy applied.
+	Strategies that don't apply to this animation are skipped.
+	"""
+	animation.coalesce()
+	for strategy in ANIMATION_STRATEGIES:
+		if strategy == 'quantize':
+			_quantize_animation(animation, QUANTIZE_COLORS)
+		elif strategy == 'decimate':
+			# dropping a frame out of two would leave a still image
+			if len(animation.sequence) <= 2:
+				continue
+			_decimate_animation(animation)
+		yield strategy, _encode_animation(animation)
+
+def _encode_animation(animation) -> bytes:
+	"""encode a coalesced animation as a GIF, storing only the parts of each frame that changed"""
+	with animation.clone() as optimized:
+		optimized.optimize_layers()
+		optimized.optimize_transparency()
+		return optimized.make_blob('gif')
+
+def _quantize_animation(animation, colors):
+	"""reduce each frame of animation to at most colors colors, which gives each frame its own palette"""
+	# Image.quantize only quantizes the current frame, and a frame's changes only reach the animation
+	# when its with block exits
+	for frame in animation.sequence:
+		with frame:
+			frame.quantize(colors, dither=False)
+
+def _decimate_animation(animation):
+	"""drop every other frame, lengthening the remaining ones so that the animation plays at the same speed"""
+	delays = [frame.delay for frame in animation.sequence]
+	# Sequence doesn't support deleting a slice with a step
+	for i in reversed(range(1, len(delays), 2)):
+		del animation.sequence[i]
+	for i, frame in enumerate(animation.sequence):
+		frame.delay = sum(delays[2 * i:2 * i + 2])
+
 def convert_to_gif(image_data: io.BytesIO) -> None:
+	_import_wand()
 	try:
 		with wand.image.Image(blob=image_data) as orig, orig.convert('gif') as converted:
 			# discord tries to stop us from abusing animated gif slots by detecting single frame gifs
@@ -80,17 +237,242 @@ def convert_to_gif(image_data: io.BytesIO) -> None:
 	except wand.exceptions.CoderError:
 		raise errors.InvalidImageError
 
-def mime_type_for_image(data):
-	if data.startswith(b'\x89PNG\r\n\x1a\n'):
+ImageInfo = collections.namedtuple('ImageInfo', 'mime width height frames animated')
+
+# how much of the end of a JPEG to search for the end of image marker, which may be followed by null padding
+JPEG_TRAILER_WINDOW = 4 * 2**10
+# JPEG start of frame markers, which hold the dimensions. C4, C8 and CC are other markers that share this range.
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+class _Reader:
+	"""Random access to small windows of a bytes-like or seekable file-like object, without copying the rest.
+
+	Reads past the end are truncated rather than raising.
+	"""
+
+	__slots__ = ('fp', 'view', 'size')
+
+	def __init__(self, data):
+		if hasattr(data, 'read'):
+			self.fp = data
+			self.size = size(data)
+		else:
+			self.fp = None
+			self.view = memoryview(data)
+			self.size = len(self.view)
+
+	def read(self, offset, length):
+		if self.fp is None:
+			return self.view[offset:offset + length]
+		with preserve_position(self.fp):
+			self.fp.seek(offset)
+			return self.fp.read(length)
+
+	def byte(self, offset):
+		"""return the byte at offset, or None if offset is past the end"""
+		window = self.read(offset, 1)
+		return window[0] if len(window) else None
+
+	def unpack(self, format: struct.Struct, offset):
+		"""unpack format from offset, or raise InvalidImageError if that would read past the end"""
+		window = self.read(offset, format.size)
+		if len(window) < format.size:
+			raise errors.InvalidImageError
+		return format.unpack(window)
+
+	def endswith_jpeg_trailer(self):
+		start = max(0, self.size - JPEG_TRAILER_WINDOW)
+		return bytes(self.read(start, self.size - start)).rstrip(b'\0').endswith(b'\xFF\xD9')
+
+def _sniff(reader, *, partial):
+	head = bytes(reader.read(0, 16))
+	if head.startswith(b'\x89PNG\r\n\x1a\n'):
 		return 'image/png'
-	if data.startswith(b'\xFF\xD8') and data.rstrip(b'\0').endswith(b'\xFF\xD9'):
+	if head.startswith(b'\xFF\xD8') and (partial or reader.endswith_jpeg_trailer()):
 		return 'image/jpeg'
-	if data.startswith((b'GIF87a', b'GIF89a')):
+	if head.startswith((b'GIF87a', b'GIF89a')):
 		return 'image/gif'
-	if data.startswith(b'RIFF') and data[8:12] == b'WEBP':
+	if head.startswith(b'RIFF') and head[8:12] == b'WEBP':
 		return 'image/webp'
 	raise errors.InvalidImageError
 
+def mime_type_for_image(data, *, partial=False):
+	"""Sniff the type of an image from its magic number.
+
+	data may be any bytes-like or seekable file-like object.
+	If partial is True, data is only the start of the image, so the JPEG end of image marker is not checked.
+	"""
+	return _sniff(_Reader(data), partial=partial)
+
+def probe(data, *, partial=False) -> ImageInfo:
+	"""Read the type, dimensions and frame count of an image from its headers, without decoding it.
+
+	data may be any bytes-like or seekable file-like object. Only the headers are read;
+	for animated images, that means the header of each frame, skipping over the image data.
+	If partial is True, data is only the start of the image. Then frames is None if the count is incomplete,
+	but animated is still True if at least two frames were seen, and width and height are None if the data
+	ends before them.
+	Raises InvalidImageError if the image type isn't supported, the headers are malformed,
+	or partial is False and the data ends before the headers do.
+	"""
+	reader = _Reader(data)
+	mime = _sniff(reader, partial=partial)
+	width, height, frames, truncated = _PROBES[mime](reader)
+	if not partial and (truncated or width is None):
+		raise errors.InvalidImageError
+	return ImageInfo(mime, width, height, None if truncated and partial else frames, frames > 1)
+
+# each of these returns (width, height, frames seen, whether the data ended before the headers did).
+# width and height are None if they weren't found.
+
+_U16_BE, _U32_BE = struct.Struct('!H'), struct.Struct('!I')
+_U16_LE_PAIR, _U32_LE = struct.Struct('<HH'), struct.Struct('<I')
+_PNG_CHUNK_HEADER = struct.Struct('!I4s')
+_PNG_IHDR = struct.Struct('!II')
+_JPEG_SOF = struct.Struct('!xHH')
+_RIFF_CHUNK_HEADER = struct.Struct('<4sI')
+
+def _probe_png(reader):
+	try:
+		width, height = reader.unpack(_PNG_IHDR, 16)
+	except errors.InvalidImageError:
+		return None, None, 0, True
+	offset = 8
+	while True:
+		try:
+			length, type = reader.unpack(_PNG_CHUNK_HEADER, offset)
+		except errors.InvalidImageError:
+			return width, height, 1, True
+		# an animation control chunk must come before the image data, if there is one
+		if type == b'acTL':
+			frames, = reader.unpack(_U32_BE, offset + 8)
+			return width, height, frames, False
+		if type in {b'IDAT', b'IEND'}:
+			return width, height, 1, False
+		offset += _PNG_CHUNK_HEADER.size + length + 4  # 4 for the CRC
+
+def _probe_gif(reader):
+	try:
+		width, height = reader.unpack(_U16_LE_PAIR, 6)
+	except errors.InvalidImageError:
+		return None, None, 0, True
+	flags = reader.byte(10)
+	if flags is None:
+		return width, height, 0, True
+	offset = 13
+	if flags & 0x80:  # global color table
+		offset += 3 * 2 ** ((flags & 0x07) + 1)
+
+	frames = 0
+	while True:
+		block = reader.byte(offset)
+		if block is None:
+			return width, height, frames, True
+		if block == 0x2C:  # image descriptor
+			frames += 1
+			flags = reader.byte(offset + 9)
+			if flags is None:
+				return width, height, frames, True
+			offset += 10
+			if flags & 0x80:  # local color table
+				offset += 3 * 2 ** ((flags & 0x07) + 1)
+			offset += 1  # LZW minimum code size
+		elif block == 0x21:  # extension
+			offset += 2
+		else:
+			# the trailer, or garbage after the last frame, which decoders ignore
+			return width, height, frames, False
+
+		# skip the data sub-blocks
+		while True:
+			length = reader.byte(offset)
+			if length is None:
+				return width, height, frames, True
+			offset += 1 + length
+			if not length:
+				break
+
+def _probe_jpeg(reader):
+	offset = 2
+	while True:
+		if reader.byte(offset) is None:
+			return None, None, 0, True
+		if reader.byte(offset) != 0xFF:
+			return None, None, 0, False
+		marker = reader.byte(offset + 1)
+		if marker == 0xFF:  # fill byte
+			offset += 1
+			continue
+		if marker in JPEG_SOF_MARKERS:
+			try:
+				height, width = reader.unpack(_JPEG_SOF, offset + 4)
+			except errors.InvalidImageError:
+				return None, None, 0, True
+			return width, height, 1, False
+		if marker is None:
+			return None, None, 0, True
+		if marker in {0xD9, 0xDA}:  # end of image or start of scan, before any frame header
+			return None, None, 0, False
+		if marker == 0x01 or 0xD0 <= marker <= 0xD7:  # markers without a length
+			offset += 2
+			continue
+		try:
+			length, = reader.unpack(_U16_BE, offset + 2)
+		except errors.InvalidImageError:
+			return None, None, 0, True
+		offset += 2 + length
+
+def _probe_webp(reader):
+	try:
+		fourcc, length = reader.unpack(_RIFF_CHUNK_HEADER, 12)
+		if fourcc == b'VP8 ':
+			width, height = reader.unpack(_U16_LE_PAIR, 26)
+			return width & 0x3FFF, height & 0x3FFF, 1, False
+		if fourcc == b'VP8L':
+			bits, = reader.unpack(_U32_LE, 21)
+			return (bits & 0x3FFF) + 1, (bits >> 14 & 0x3FFF) + 1, 1, False
+	except errors.InvalidImageError:
+		return None, None, 0, True
+	if fourcc != b'VP8X':
+		raise errors.InvalidImageError
+
+	flags = reader.byte(20)
+	dimensions = reader.read(24, 6)
+	if len(dimensions) < 6:
+		return None, None, 0, True
+	width = int.from_bytes(dimensions[:3], 'little') + 1
+	height = int.from_bytes(dimensions[3:], 'little') + 1
+	if not flags & 0x02:  # animation
+		return width, height, 1, False
+
+	frames = 0
+	offset = 20 + length + (length & 1)
+	while offset < reader.size:
+		try:
+			fourcc, length = reader.unpack(_RIFF_CHUNK_HEADER, offset)
+		except errors.InvalidImageError:
+			return width, height, frames, True
+		frames += fourcc == b'ANMF'
+		offset += _RIFF_CHUNK_HEADER.size + length + (length & 1)
+	# the RIFF header says how big the file should be
+	riff_size, = reader.unpack(_U32_LE, 4)
+	return width, height, frames, offset < 8 + riff_size
+
+_PROBES = {'image/png': _probe_png, 'image/gif': _probe_gif, 'image/jpeg': _probe_jpeg, 'image/webp': _probe_webp}
+
+def already_fits(image_data) -> bool:
+	"""Return whether resize_until_small would leave image_data as is, judging only by its size and headers.
+
+	Images with headers we can't make sense of are left for ImageMagick to judge.
+	"""
+	if len(image_data) > MAX_EMOTE_SIZE:
+		return False
+	try:
+		probe(image_data)
+	except errors.InvalidImageError:
+		return False
+	return True
+
 def image_to_base64_url(data):
 	fmt = 'data:{mime};base64,{data}'
 	mime = mime_type_for_image(data)
@@ -98,14 +480,19 @@ def image_to_base64_url(data):
 	return fmt.format(mime=mime, data=b64)
 
 def main() -> typing.NoReturn:
-	"""resize or convert an image from stdin and write the resized or converted version to stdout."""
+	"""resize or convert an image from stdin and write the resized or converted version to stdout.
+
+	If the first argument is "worker", process framed jobs from stdin until EOF instead. See ImageWorker.
+	The optional second argument is then a JSON object of ImageLimits.
+	"""
 	import sys
 
-	if sys.argv[1] == 'resize':
-		f = resize_until_small
-	elif sys.argv[1] == 'convert':
-		f = convert_to_gif
-	else:
+	if sys.argv[1] == 'worker':
+		worker_main(ImageLimits(**json.loads(sys.argv[2])) if len(sys.argv) > 2 else ImageLimits())
+
+	try:
+		f = COMMANDS[sys.argv[1]]
+	except KeyError:
 		sys.exit(1)
 
 	data = io.BytesIO(sys.stdin.buffer.read())
@@ -126,26 +513,315 @@ def main() -> typing.NoReturn:
 
 	sys.exit(0)
 
-async def process_image_in_subprocess(command_name, image_data: bytes):
-	proc = await asyncio.create_subprocess_exec(
-		sys.executable, '-m', __name__, command_name,
+COMMANDS = {'resize': resize_until_small, 'convert': convert_to_gif}
+# the index of each command in this tuple is its opcode on the wire
+COMMAND_NAMES = tuple(COMMANDS)
 
-		stdin=asyncio.subprocess.PIPE,
-		stdout=asyncio.subprocess.PIPE,
-		stderr=asyncio.subprocess.PIPE)
+# request frame: opcode, payload length. response frame: status, payload length.
+FRAME_HEADER = struct.Struct('!BI')
+STATUS_OK = 0
+STATUS_ERROR = 1
+STATUS_INVALID_IMAGE = 2
+STATUS_RESOURCE_LIMIT = 3
 
-	try:
-		image_data, err = await asyncio.wait_for(proc.communicate(image_data), timeout=float('inf'))
-	except asyncio.TimeoutError:
-		proc.send_signal(signal.SIGINT)
-		raise errors.ImageResizeTimeoutError if command_name == 'resize' else errors.ImageConversionTimeoutError
-	else:
-		if proc.returncode == 2:
+"""Resource limits for each image worker. None means unlimited.
+
+address_space: bytes of virtual memory the whole worker process may use (RLIMIT_AS).
+cpu_time: seconds of CPU time each job may use (RLIMIT_CPU, raised before each job).
+The rest are ImageMagick's own limits: memory and map in bytes, area in pixels, width and height in pixels.
+"""
+ImageLimits = collections.namedtuple(
+	'ImageLimits', 'address_space cpu_time memory map area width height',
+	defaults=(None,) * 7)
+
+DEFAULT_IMAGE_LIMITS = ImageLimits(
+	address_space=2 * 2**30,
+	cpu_time=60,
+	memory=256 * 2**20,
+	map=512 * 2**20,
+	area=128 * 10**6,
+	width=16384,
+	height=16384)
+
+# ImageLimits fields which are set through wand.resource.limits
+IMAGEMAGICK_LIMITS = ('memory', 'map', 'area', 'width', 'height')
+
+def _apply_process_limits(limits: ImageLimits):
+	if limits.address_space is not None:
+		resource.setrlimit(resource.RLIMIT_AS, (limits.address_space, limits.address_space))
+
+def _apply_imagemagick_limits(limits: ImageLimits):
+	for name in IMAGEMAGICK_LIMITS:
+		value = getattr(limits, name)
+		if value is not None:
+			wand.resource.limits[name] = value
+
+def _limit_cpu_time_for_next_job(seconds):
+	"""Let the next job use seconds of CPU time. RLIMIT_CPU counts the whole process's lifetime, so extend it."""
+	usage = resource.getrusage(resource.RUSAGE_SELF)
+	soft = math.ceil(usage.ru_utime + usage.ru_stime) + seconds
+	_, hard = resource.getrlimit(resource.RLIMIT_CPU)
+	if hard != resource.RLIM_INFINITY:
+		soft = min(soft, hard)
+	resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+def worker_main(limits: ImageLimits = ImageLimits()) -> typing.NoReturn:
+	"""process framed image jobs from stdin, writing framed responses to stdout, until stdin is closed."""
+	stdin = sys.stdin.buffer
+	stdout = sys.stdout.buffer
+	resource_errors = (MemoryError,)
+	# load ImageMagick before the first job arrives rather than during it,
+	# and before limiting our address space, which the shared libraries count towards
+	with contextlib.suppress(ImportError, OSError):
+		_import_wand()
+		_apply_imagemagick_limits(limits)
+		resource_errors += (wand.exceptions.ResourceLimitError,)
+	_apply_process_limits(limits)
+
+	while True:
+		header = stdin.read(FRAME_HEADER.size)
+		if len(header) < FRAME_HEADER.size:
+			# the pool closed our stdin
+			sys.exit(0)
+
+		opcode, length = FRAME_HEADER.unpack(header)
+		payload = stdin.read(length)
+		if len(payload) < length:
+			# the pool closed our stdin in the middle of a job, so it isn't waiting for the result
+			sys.exit(0)
+		data = io.BytesIO(payload)
+		if limits.cpu_time is not None:
+			_limit_cpu_time_for_next_job(limits.cpu_time)
+
+		try:
+			COMMANDS[COMMAND_NAMES[opcode]](data)
+		except errors.InvalidImageError:
+			status, payload = STATUS_INVALID_IMAGE, b''
+		except resource_errors:
+			status, payload = STATUS_RESOURCE_LIMIT, b''
+		except Exception:
+			status, payload = STATUS_ERROR, traceback.format_exc().encode('utf-8')
+		else:
+			status, payload = STATUS_OK, data.getbuffer()
+
+		stdout.write(FRAME_HEADER.pack(status, len(payload)))
+		stdout.write(payload)
+		stdout.flush()
+		del payload, data  # release the buffer export before the next job
+
+class ImageWorker:
+	"""A long-lived `python -m utils.image worker` process which handles one job at a time."""
+
+	def __init__(self, proc):
+		self.proc = proc
+		self.jobs = 0
+		self._killed = False
+
+	@classmethod
+	async def spawn(cls, limits: ImageLimits = ImageLimits()):
+		proc = await asyncio.create_subprocess_exec(
+			sys.executable, '-m', __name__, 'worker', json.dumps(limits._asdict()),
+
+			stdin=asyncio.subprocess.PIPE,
+			stdout=asyncio.subprocess.PIPE,
+			# inherit stderr so that warnings from the worker end up in our logs
+			stderr=None)
+		return cls(proc)
+
+	@property
+	def alive(self):
+		# returncode is only set once the child has been reaped, which happens some time after kill()
+		return not self._killed and self.proc.returncode is None
+
+	async def run(self, command_name, image_data: bytes):
+		"""Send one job to the worker and return the (status, payload) of its response."""
+		self.jobs += 1
+		self.proc.stdin.write(FRAME_HEADER.pack(COMMAND_NAMES.index(command_name), len(image_data)))
+		self.proc.stdin.write(image_data)
+		await self.proc.stdin.drain()
+
+		status, length = FRAME_HEADER.unpack(await self.proc.stdout.readexactly(FRAME_HEADER.size))
+		return status, await self.proc.stdout.readexactly(length)
+
+	def kill(self):
+		self._killed = True
+		with contextlib.suppress(ProcessLookupError):
+			self.proc.kill()
+
+	async def kill_and_wait(self) -> int:
+		"""Kill a worker which has stopped responding and reap it, returning its exit status.
+
+		That is quick, since SIGKILL can't be ignored. If the worker had already died, its own exit status is kept.
+		"""
+		self.kill()
+		return await self.proc.wait()
+
+	async def close(self):
+		if not self.alive:
+			return
+		self.proc.stdin.close()
+		try:
+			await asyncio.wait_for(self.proc.wait(), timeout=5)
+		except asyncio.TimeoutError:
+			self.kill()
+			await self.proc.wait()
+
+class ImageWorkerPool:
+	"""A pool of pre-warmed image workers, so that each job does not pay for interpreter startup and importing Wand.
+
+	size: the maximum number of workers, which is also the maximum number of concurrent jobs.
+	timeout: seconds a single job may take before its worker is killed. None means no timeout.
+	max_jobs: recycle a worker after it has processed this many jobs, to contain memory leaks in ImageMagick.
+	limits: the ImageLimits each worker runs under. Jobs which exceed them raise ImageResourceLimitError.
+
+	Resize jobs for images that already fit never reach a worker. `skipped` and `processed` count the jobs
+	that were handled in process and by a worker respectively.
+	"""
+
+	def __init__(self, size=2, *, timeout=None, max_jobs=100, limits: ImageLimits = ImageLimits()):
+		self.size = size
+		self.timeout = timeout
+		self.max_jobs = max_jobs
+		self.limits = limits
+		self._idle = []
+		# every worker that hasn't been retired, whether idle or busy, and how many more are being spawned
+		self._workers = set()
+		self._spawning = 0
+		# workers being closed and replaced in the background, which close() waits for
+		self._tasks = set()
+		self._sem = asyncio.Semaphore(size)
+		self._closed = False
+		self.skipped = self.processed = 0
+
+	@property
+	def live_workers(self):
+		return len(self._workers) + self._spawning
+
+	async def start(self):
+		"""Pre-warm the pool by spawning workers up front, up to its size, counting those that are already running."""
+		workers = await asyncio.gather(*(self._spawn() for _ in range(self.size - self.live_workers)))
+		for worker in workers:
+			self._release(worker)
+
+	async def process(self, command_name, image_data: bytes) -> bytes:
+		if self._closed:
+			raise RuntimeError('the image worker pool is closed')
+
+		if command_name == 'resize' and already_fits(image_data):
+			self.skipped += 1
+			return image_data
+
+		self.processed += 1
+		async with self._sem:
+			worker = await self._acquire()
+			try:
+				status, payload = await asyncio.wait_for(worker.run(command_name, image_data), timeout=self.timeout)
+			except asyncio.TimeoutError:
+				worker.kill()
+				raise errors.ImageResizeTimeoutError if command_name == 'resize' else errors.ImageConversionTimeoutError
+			except (asyncio.IncompleteReadError, BrokenPipeError, ConnectionResetError) as exc:
+				returncode = await worker.kill_and_wait()
+				# the job exceeded its CPU time. Exceeding the address space limit shows up as a MemoryError
+				# or ImageMagick ResourceLimitError in the worker instead, which it reports in its response.
+				# Anything else, such as the OOM killer or someone else's SIGKILL, isn't one of our limits.
+				if returncode == -signal.SIGXCPU:
+					raise errors.ImageResourceLimitError from exc
+				raise RuntimeError(f'image worker died. Return code: {returncode}') from exc
+			except BaseException:
+				# we may have been cancelled in the middle of a frame, so the worker's pipes are in an unknown state
+				worker.kill()
+				raise
+			finally:
+				self._release(worker)
+
+		if status == STATUS_INVALID_IMAGE:
 			raise errors.InvalidImageError
-		if proc.returncode != 0:
-			raise RuntimeError(err.decode('utf-8') + f'Return code: {proc.returncode}')
+		if status == STATUS_RESOURCE_LIMIT:
+			raise errors.ImageResourceLimitError
+		if status != STATUS_OK:
+			raise RuntimeError(payload.decode('utf-8'))
+
+		return payload
+
+	async def _acquire(self):
+		while self._idle:
+			worker = self._idle.pop()
+			if worker.alive:
+				return worker
+			self._retire(worker)
+		return await self._spawn()
+
+	async def _spawn(self):
+		self._spawning += 1
+		try:
+			worker = await ImageWorker.spawn(self.limits)
+		finally:
+			self._spawning -= 1
+		self._workers.add(worker)
+		return worker
+
+	def _release(self, worker):
+		if self._closed or not worker.alive or worker.jobs >= self.max_jobs:
+			self._retire(worker)
+			if not self._closed:
+				# keep the pool warm
+				self._in_background(self._replace())
+			return
+		if self.live_workers > self.size:
+			# more workers were spawned on demand while this one was busy
+			self._retire(worker)
+			return
+		self._idle.append(worker)
+
+	def _retire(self, worker):
+		self._workers.discard(worker)
+		self._in_background(worker.close())
+
+	def _in_background(self, coro):
+		task = asyncio.ensure_future(coro)
+		self._tasks.add(task)
+		task.add_done_callback(self._tasks.discard)
 
-	return image_data
+	async def _replace(self):
+		if self.live_workers >= self.size:
+			return
+		try:
+			worker = await self._spawn()
+		except Exception:
+			# the next job will try again
+			logger.exception('failed to spawn a replacement image worker')
+			return
+		self._release(worker)
+
+	async def close(self):
+		"""Close the idle workers, and wait for any being closed or replaced in the background.
+
+		Busy workers are closed as soon as their job is done.
+		"""
+		self._closed = True
+		idle, self._idle = self._idle, []
+		for worker in idle:
+			self._retire(worker)
+		while self._tasks:
+			await asyncio.gather(*self._tasks, return_exceptions=True)
+
+_pool = None
+
+def configure_pool(**kwargs) -> ImageWorkerPool:
+	"""Replace the pool used by process_image_in_subprocess. Takes the same arguments as ImageWorkerPool."""
+	global _pool
+	old, _pool = _pool, ImageWorkerPool(**kwargs)
+	if old is not None:
+		asyncio.ensure_future(old.close())
+	return _pool
+
+def get_pool() -> ImageWorkerPool:
+	if _pool is None:
+		configure_pool()
+	return _pool
+
+async def process_image_in_subprocess(command_name, image_data: bytes):
+	return await get_pool().process(command_name, image_data)
 
 resize_in_subprocess = functools.partial(process_image_in_subprocess, 'resize')
 convert_to_gif_in_subprocess = functools.partial(process_image_in_subprocess, 'convert')
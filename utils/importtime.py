@@ -0,0 +1,88 @@
+# © 2018–2020 io mintz <io@mintz.cc>
+#
+# Emote Manager is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# Emote Manager is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Emote Manager. If not, see <https://www.gnu.org/licenses/>.
+
+"""break down how long starting the bot spends importing modules
+
+usage: python -m utils.importtime [-n LIMIT] [--deferred] [--json] [module ...]
+
+By default, profiles importing bot.py and every startup extension, in a fresh interpreter,
+using the output of `python -X importtime`.
+"""
+
+import argparse
+import collections
+import json
+import subprocess
+import sys
+import typing
+
+ImportTime = collections.namedtuple('ImportTime', 'module self_us cumulative_us depth')
+
+PROFILE_STARTUP = '''
+import importlib, bot
+extensions = bot.Bot.startup_extensions
+if {deferred}:
+	extensions += bot.Bot.deferred_extensions
+for extension in extensions:
+	importlib.import_module(extension)
+'''
+
+def profile(code) -> typing.List[ImportTime]:
+	"""Run code in a fresh interpreter and return the time taken by each import it made, in import order."""
+	proc = subprocess.run(
+		[sys.executable, '-X', 'importtime', '-c', code],
+		stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+	if proc.returncode:
+		sys.stderr.write(proc.stderr)
+		raise RuntimeError(f'profiled interpreter exited with status {proc.returncode}')
+	return list(parse(proc.stderr.splitlines()))
+
+def parse(lines):
+	for line in lines:
+		# import time: self [us] | cumulative | imported package
+		if not line.startswith('import time:') or line.endswith('imported package'):
+			continue
+		self_us, cumulative_us, name = line[len('import time:'):].split('|')
+		depth = (len(name) - len(name.lstrip()) - 1) // 2
+		yield ImportTime(name.strip(), int(self_us), int(cumulative_us), depth)
+
+def main():
+	parser = argparse.ArgumentParser(prog='python -m utils.importtime', description=__doc__.partition('\n')[0])
+	parser.add_argument('modules', nargs='*', help='modules to profile instead of the bot startup')
+	parser.add_argument('-n', '--limit', type=int, default=25, help='how many of the slowest imports to show')
+	parser.add_argument('--deferred', action='store_true', help='also import the deferred extensions')
+	parser.add_argument('--json', action='store_true', help='print every import as JSON, for comparing between runs')
+	args = parser.parse_args()
+
+	if args.modules:
+		code = ''.join(f'import {module}\n' for module in args.modules)
+	else:
+		code = PROFILE_STARTUP.format(deferred=args.deferred)
+	times = profile(code)
+
+	# top level imports don't overlap, so their cumulative times add up to the total
+	total_us = sum(time.cumulative_us for time in times if time.depth == 0)
+	if args.json:
+		json.dump({'total_us': total_us, 'imports': [time._asdict() for time in times]}, sys.stdout, indent='\t')
+		print()
+		return
+
+	print(f'{"cumulative ms":>13}  {"self ms":>8}  module')
+	for time in sorted(times, key=lambda time: time.cumulative_us, reverse=True)[:args.limit]:
+		print(f'{time.cumulative_us / 1000:13.1f}  {time.self_us / 1000:8.1f}  {time.module}')
+	print(f'{total_us / 1000:13.1f}  {"":8}  total')
+
+if __name__ == '__main__':
+	main()
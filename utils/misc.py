@@ -64,3 +64,8 @@ async def gather_or_cancel(*awaitables, loop=None):
 	except:
 		gather_task.cancel()
 		raise
+
+async def as_async_iterable(iterable):
+	"""Turn a regular iterable into an asynchronous one."""
+	for x in iterable:
+		yield x
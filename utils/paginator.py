@@ -14,15 +14,116 @@
 # along with Emote Manager. If not, see <https://www.gnu.org/licenses/>.
 
 import asyncio
+import collections
 import contextlib
+import heapq
+import itertools
 import typing
+import weakref
 
 import discord
+import discord.http
 from discord.ext.commands import Context
 
 # Copyright © 2016-2017 Pandentia and contributors
 # https://github.com/Thessia/Liara/blob/75fa11948b8b2ea27842d8815a32e51ef280a999/cogs/utils/paginator.py
 
+class PaginatorDispatcher:
+	"""Routes reaction and interaction events to active paginators with one dict lookup by message ID,
+	and times out idle paginators from a single heap of deadlines and one timer,
+	instead of each paginator running its own wait_for.
+	"""
+
+	INTERACTION_TYPE_COMPONENT = 3
+
+	# bot -> its dispatcher
+	_dispatchers = weakref.WeakKeyDictionary()
+
+	def __init__(self, bot):
+		self.bot = bot
+		# message ID -> paginator
+		self._paginators = {}
+		# (deadline, sequence number, message ID). Entries are not removed when a deadline is extended,
+		# so those with a deadline that doesn't match the paginator's current one are skipped when they come up.
+		self._deadlines = []
+		self._sequence = itertools.count()
+		self._timer = None
+
+	@classmethod
+	def for_bot(cls, bot):
+		"""Get the dispatcher for a bot, installing one if necessary."""
+		try:
+			return cls._dispatchers[bot]
+		except KeyError:
+			return cls.install(bot)
+
+	@classmethod
+	def install(cls, bot):
+		self = cls._dispatchers[bot] = cls(bot)
+		bot.add_listener(self.on_raw_reaction_add)
+		bot.add_listener(self.on_socket_response)
+		return self
+
+	def uninstall(self):
+		self.bot.remove_listener(self.on_raw_reaction_add)
+		self.bot.remove_listener(self.on_socket_response)
+		if self._timer is not None:
+			self._timer.cancel()
+		if self._dispatchers.get(self.bot) is self:
+			del self._dispatchers[self.bot]
+
+	def register(self, paginator):
+		self._paginators[paginator.message_id] = paginator
+		self.touch(paginator)
+
+	def unregister(self, paginator):
+		if self._paginators.get(paginator.message_id) is paginator:
+			del self._paginators[paginator.message_id]
+
+	def touch(self, paginator):
+		"""Restart the timeout of a paginator, because somebody used it."""
+		if paginator.timeout is None:
+			return
+		paginator._deadline = deadline = self.bot.loop.time() + paginator.timeout
+		heapq.heappush(self._deadlines, (deadline, next(self._sequence), paginator.message_id))
+		if self._timer is None or deadline < self._timer.when():
+			self._schedule()
+
+	def _schedule(self):
+		if self._timer is not None:
+			self._timer.cancel()
+			self._timer = None
+		if self._deadlines:
+			self._timer = self.bot.loop.call_at(self._deadlines[0][0], self._expire)
+
+	def _expire(self):
+		self._timer = None
+		now = self.bot.loop.time()
+		while self._deadlines and self._deadlines[0][0] <= now:
+			deadline, _, message_id = heapq.heappop(self._deadlines)
+			paginator = self._paginators.get(message_id)
+			if paginator is None or paginator._deadline != deadline:
+				continue
+			self.unregister(paginator)
+			self.bot.loop.create_task(paginator.on_timeout())
+		self._schedule()
+
+	async def on_raw_reaction_add(self, reaction: discord.RawReactionActionEvent):
+		paginator = self._paginators.get(reaction.message_id)
+		if paginator is not None and paginator.react_check(reaction):
+			self.touch(paginator)
+			await paginator.on_reaction(reaction)
+
+	async def on_socket_response(self, msg):
+		if msg.get('t') != 'INTERACTION_CREATE':
+			return
+		interaction = msg['d']
+		if interaction.get('type') != self.INTERACTION_TYPE_COMPONENT:
+			return
+		paginator = self._paginators.get(int(interaction.get('message', {}).get('id', 0)))
+		if paginator is not None:
+			await paginator.on_interaction(interaction)
+
 class Paginator:
 	def __init__(self, ctx: Context, pages: typing.Iterable, *, timeout=300, delete_message=False,
 				 delete_message_on_timeout=False, text_message=None):
@@ -39,6 +140,10 @@ class Paginator:
 		self._embed = None
 		self._message = None
 		self._client = ctx.bot
+		self._dispatcher = PaginatorDispatcher.for_bot(ctx.bot)
+		self._done = None
+		self._deadline = None
+		self._lock = asyncio.Lock()
 
 		self.footer = 'Page {} of {}'
 		self.navigation = {
@@ -61,40 +166,68 @@ class Paginator:
 		target_emoji = str(reaction.emoji)
 		return bool(discord.utils.find(lambda emoji: target_emoji == emoji, self.navigation))
 
+	@property
+	def message_id(self):
+		"""the ID of the paginator's message, or None if it hasn't been sent yet"""
+		return None if self._message is None else self._message.id
+
 	async def begin(self):
-		"""Starts pagination"""
+		"""Starts pagination, returning once it has stopped."""
 		self._stopped = False
 		self._embed = discord.Embed()
+		self._done = self._client.loop.create_future()
 		await self.first_page()
+		if self._stopped:
+			# stopped while the first page was being sent, so clean up the message now that it exists
+			await self.stop()
+			return
+		self._dispatcher.register(self)
 		for button in self.navigation:
+			if self._stopped:
+				break
 			await self._message.add_reaction(button)
-		while not self._stopped:
-			try:
-				reaction: RawReactionActionEvent = await self._client.wait_for(
-					'raw_reaction_add',
-					check=self.react_check,
-					timeout=self.timeout)
-			except asyncio.TimeoutError:
-				await self.stop(delete=self.delete_msg_timeout)
-				continue
+		await self._done
 
+	async def on_reaction(self, reaction: discord.RawReactionActionEvent):
+		async with self._lock:
 			await self.navigation[str(reaction.emoji)]()
+			if self._stopped:
+				return
 
 			await asyncio.sleep(0.2)
+			if self._stopped:
+				# our reactions have already been cleared
+				return
 			with contextlib.suppress(discord.HTTPException):
 				await self._message.remove_reaction(reaction.emoji, discord.Object(reaction.user_id))
 
+	async def on_interaction(self, interaction):
+		"""Handle a button click on our message. Reaction paginators have no buttons, so there's nothing to do."""
+
+	async def on_timeout(self):
+		await self.stop(delete=self.delete_msg_timeout)
+
+	def _mark_stopped(self):
+		self._stopped = True
+		# we're only registered once our message has been sent
+		if self.message_id is not None:
+			self._dispatcher.unregister(self)
+		if self._done is not None and not self._done.done():
+			self._done.set_result(None)
+
 	async def stop(self, *, delete=None):
 		"""Aborts pagination."""
 		if delete is None:
 			delete = self.delete_msg
 
+		self._mark_stopped()
+		if self._message is None:
+			return
 		if delete:
 			with contextlib.suppress(discord.HTTPException):
 				await self._message.delete()
 		else:
 			await self._clear_reactions()
-		self._stopped = True
 
 	async def _clear_reactions(self):
 		try:
@@ -106,9 +239,16 @@ class Paginator:
 		except discord.HTTPException:
 			pass
 
+	@property
+	def page_count(self):
+		return len(self.pages)
+
+	def get_page(self, index):
+		return self.pages[index]
+
 	async def format_page(self):
-		self._embed.description = self.pages[self._page]
-		self._embed.set_footer(text=self.footer.format(self._page + 1, len(self.pages)))
+		self._embed.description = self.get_page(self._page)
+		self._embed.set_footer(text=self.footer.format(self._page + 1, self.page_count))
 
 		kwargs = {'embed': self._embed}
 		if self.text_message:
@@ -125,37 +265,190 @@ class Paginator:
 
 	async def next_page(self):
 		self._page += 1
-		if self._page == len(self.pages):  # avoid the inevitable IndexError
+		if self._page == self.page_count:  # avoid the inevitable IndexError
 			self._page = 0
 		await self.format_page()
 
 	async def previous_page(self):
 		self._page -= 1
 		if self._page < 0:	# ditto
-			self._page = len(self.pages) - 1
+			self._page = self.page_count - 1
 		await self.format_page()
 
 	async def last_page(self):
-		self._page = len(self.pages) - 1
+		self._page = self.page_count - 1
 		await self.format_page()
 
-class ListPaginator(Paginator):
-	def __init__(self, ctx, _list: list, per_page=10, **kwargs):
-		pages = []
-		page = ''
-		c = 0
-		l = len(_list)
-		for i in _list:
-			if c > l:
-				break
-			if c % per_page == 0 and page:
-				pages.append(page.strip())
-				page = ''
-			page += '{}. {}\n'.format(c+1, i)
+class ComponentPaginator(Paginator):
+	"""A Paginator which navigates with message buttons instead of reactions.
+
+	The message is sent along with its buttons in one request, and each button's custom ID encodes the page it
+	leads to, so a click is answered by one interaction response that updates the message in place,
+	with no cleanup requests afterwards. It doesn't need the guild reactions intent either.
+
+	discord.py 1.x doesn't know about message components, so this makes its own requests where discord.py has no
+	method for them, still through discord.py's HTTP client and so its rate limiter,
+	and PaginatorDispatcher picks interactions out of the raw gateway stream.
+	"""
+
+	CUSTOM_ID_PREFIX = 'em-page'
+	RESPONSE_MESSAGE = 4
+	RESPONSE_DEFERRED_UPDATE = 6
+	RESPONSE_UPDATE = 7
+	EPHEMERAL = 1 << 6
+
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self._message_id = None
+		self._buttons = {
+			'first': ('\N{BLACK LEFT-POINTING DOUBLE TRIANGLE WITH VERTICAL BAR}', lambda page: 0),
+			'previous': ('\N{BLACK LEFT-POINTING TRIANGLE}', lambda page: (page - 1) % self.page_count),
+			'next': ('\N{BLACK RIGHT-POINTING TRIANGLE}', lambda page: (page + 1) % self.page_count),
+			'last': ('\N{BLACK RIGHT-POINTING DOUBLE TRIANGLE WITH VERTICAL BAR}', lambda page: self.page_count - 1),
+			'stop': ('\N{BLACK SQUARE FOR STOP}', lambda page: page),
+		}
+
+	@property
+	def message_id(self):
+		return self._message_id
 
-			c += 1
-		pages.append(page.strip())
+	def react_check(self, reaction):
+		return False
+
+	async def begin(self):
+		"""Starts pagination, returning once it has stopped."""
+		self._stopped = False
+		self._embed = discord.Embed()
+		self._done = self._client.loop.create_future()
+		self._page = 0
+		await self.format_page()
+		if self._stopped:
+			# stopped while the first page was being sent, so clean up the message now that it exists
+			await self.stop()
+			return
+		self._dispatcher.register(self)
+		await self._done
+
+	async def on_interaction(self, interaction):
+		user = interaction.get('member', {}).get('user') or interaction['user']
+		if int(user['id']) != self.author.id:
+			await self._respond(interaction, self.RESPONSE_MESSAGE, {
+				'content': 'Only the person who ran this command can change the page.',
+				'flags': self.EPHEMERAL})
+			return
+
+		prefix, action, page = interaction['data']['custom_id'].split(':')
+		if action == 'stop':
+			await self.stop(interaction=interaction)
+			return
+
+		self._dispatcher.touch(self)
+		self._page = max(0, min(self.page_count - 1, int(page)))
+		with contextlib.suppress(discord.HTTPException):
+			await self._respond(interaction, self.RESPONSE_UPDATE, self._payload())
+
+	def _payload(self, *, buttons=True):
+		self._embed.description = self.get_page(self._page)
+		self._embed.set_footer(text=self.footer.format(self._page + 1, self.page_count))
+
+		payload = {'embeds': [self._embed.to_dict()], 'components': []}
+		if self.text_message:
+			payload['content'] = self.text_message
+		if buttons:
+			payload['components'].append({'type': 1, 'components': [
+				{
+					'type': 2,
+					'style': 2,  # grey
+					'emoji': {'name': emoji},
+					'custom_id': f'{self.CUSTOM_ID_PREFIX}:{action}:{target(self._page)}',
+				}
+				for action, (emoji, target)
+				in self._buttons.items()]})
+		return payload
+
+	def _respond(self, interaction, type, data=None):
+		route = discord.http.Route(
+			'POST', '/interactions/{interaction_id}/{interaction_token}/callback',
+			interaction_id=interaction['id'], interaction_token=interaction['token'])
+		payload = {'type': type}
+		if data is not None:
+			payload['data'] = data
+		return self._client.http.request(route, json=payload)
+
+	async def format_page(self):
+		payload = self._payload()
+		if self._message_id is None:
+			# HTTPClient.send_message doesn't take components
+			route = discord.http.Route('POST', '/channels/{channel_id}/messages', channel_id=self.target.id)
+			data = await self._client.http.request(route, json=payload)
+			self._message_id = int(data['id'])
+		else:
+			await self._client.http.edit_message(self.target.id, self._message_id, **payload)
+
+	async def stop(self, *, delete=None, interaction=None):
+		"""Aborts pagination."""
+		if delete is None:
+			delete = self.delete_msg
+
+		self._mark_stopped()
+		if self._message_id is None:
+			return
+
+		with contextlib.suppress(discord.HTTPException):
+			if interaction is not None and not delete:
+				await self._respond(interaction, self.RESPONSE_UPDATE, self._payload(buttons=False))
+				return
+
+			if interaction is not None:
+				await self._respond(interaction, self.RESPONSE_DEFERRED_UPDATE)
+			if delete:
+				await self._client.http.delete_message(self.target.id, self._message_id)
+			else:
+				await self._client.http.edit_message(self.target.id, self._message_id, components=[])
+
+class ListPaginatorMixin:
+	"""Paginate a numbered list. Pages are only rendered when they're shown, and the last few are kept around.
+
+	_list: a sequence of entries, which is not copied.
+	formatter: a callable which converts an entry to a string.
+	"""
+
+	PAGE_CACHE_SIZE = 4
+
+	def __init__(self, ctx, _list: typing.Sequence, per_page=10, *, formatter=str, **kwargs):
+		if not isinstance(_list, typing.Sequence):
+			_list = list(_list)
+		self.entries = _list
+		self.per_page = per_page
+		self.formatter = formatter
+		self._page_cache = collections.OrderedDict()
 		# shut up, IDEA
 		# noinspection PyArgumentList
-		super().__init__(ctx, pages, **kwargs)
-		self.footer += ' ({} entries)'.format(l)
+		super().__init__(ctx, (), **kwargs)
+		self.footer += ' ({} entries)'.format(len(_list))
+
+	@property
+	def page_count(self):
+		return max(1, -(-len(self.entries) // self.per_page))
+
+	def get_page(self, index):
+		with contextlib.suppress(KeyError):
+			self._page_cache.move_to_end(index)
+			return self._page_cache[index]
+
+		start = index * self.per_page
+		page = '\n'.join(
+			'{}. {}'.format(i, self.formatter(entry))
+			for i, entry
+			in enumerate(self.entries[start:start + self.per_page], start + 1)).strip()
+
+		self._page_cache[index] = page
+		if len(self._page_cache) > self.PAGE_CACHE_SIZE:
+			self._page_cache.popitem(last=False)
+		return page
+
+class ListPaginator(ListPaginatorMixin, Paginator):
+	pass
+
+class ComponentListPaginator(ListPaginatorMixin, ComponentPaginator):
+	pass
@@ -0,0 +1,127 @@
+# © 2018–2020 io mintz <io@mintz.cc>
+#
+# Emote Manager is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# Emote Manager is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Emote Manager. If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import contextlib
+import io
+import time
+
+import discord
+
+class ProgressMessage:
+	"""Report the results of a bulk command by editing one message, rather than sending one message per item.
+
+	Lines are added with add(), and the message is edited at most once every EDIT_INTERVAL seconds.
+	Once the lines no longer fit in one message, the message shows only the most recent ones,
+	and finish() attaches the full log as a text file.
+	"""
+
+	MAX_LENGTH = 2000
+	EDIT_INTERVAL = 2
+	LOG_FILENAME = 'results.txt'
+
+	def __init__(self, context):
+		self.context = context
+		self.lines = []
+		self._length = -1  # the length of all the lines joined by newlines
+		self._message = None
+		self._sent = None
+		self._last_flush = 0
+		self._flusher = None  # the task waiting to flush, if any
+		self._flushes = set()  # every flush task that hasn't finished, including one in the middle of sending
+		self._lock = asyncio.Lock()
+
+	def add(self, line):
+		self.lines.append(line)
+		self._length += len(line) + 1
+
+		if self._flusher is None:
+			self._flusher = asyncio.ensure_future(self._flush_later())
+			self._flushes.add(self._flusher)
+			self._flusher.add_done_callback(self._flushes.discard)
+
+	@property
+	def overflowed(self):
+		return self._length > self.MAX_LENGTH
+
+	def render(self, *, final=False):
+		if not self.overflowed:
+			return '\n'.join(self.lines)
+
+		if final:
+			header = f'{len(self.lines)} results. The full list is attached.'
+		else:
+			header = f'{len(self.lines)} results so far. The full list will be attached when I am done.'
+		header += '\n…'
+
+		# show as many of the most recent lines as will fit
+		length = len(header)
+		start = len(self.lines)
+		while start and length + 1 + len(self.lines[start - 1]) <= self.MAX_LENGTH:
+			start -= 1
+			length += 1 + len(self.lines[start])
+		return '\n'.join([header, *self.lines[start:]])
+
+	async def _flush_later(self):
+		await asyncio.sleep(max(0, self._last_flush + self.EDIT_INTERVAL - time.monotonic()))
+		# past this point we may not be cancelled, since we may be in the middle of sending a message
+		self._flusher = None
+		await self._flush()
+
+	async def _flush(self, *, final=False):
+		async with self._lock:
+			self._last_flush = time.monotonic()
+			content = self.render(final=final)
+			if not content or content == self._sent:
+				return
+
+			# a failed send or edit is retried by the next flush
+			with contextlib.suppress(discord.HTTPException):
+				if self._message is None:
+					self._message = await self.context.send(content)
+				else:
+					await self._message.edit(content=content)
+				self._sent = content
+
+	async def finish(self):
+		"""Send any lines that haven't been sent yet, along with the full log if they didn't all fit."""
+		if self._flusher is not None:
+			# it's still sleeping
+			self._flusher.cancel()
+			self._flusher = None
+		# let a flush that's already sending finish first, so that the final one doesn't race it
+		await asyncio.gather(*self._flushes, return_exceptions=True)
+		await self._flush(final=True)
+
+		if not self.overflowed:
+			return
+
+		log = io.BytesIO('\n'.join(self.lines).encode('utf-8'))
+		try:
+			await self.context.send(file=discord.File(log, self.LOG_FILENAME))
+		except discord.Forbidden:
+			# no permission to attach files, so send the rest in as few messages as possible
+			await self._send_pages()
+
+	async def _send_pages(self):
+		page = ''
+		for line in self.lines:
+			line = line[:self.MAX_LENGTH]
+			if page and len(page) + 1 + len(line) > self.MAX_LENGTH:
+				await self.context.send(page)
+				page = ''
+			page = f'{page}\n{line}' if page else line
+		if page:
+			await self.context.send(page)